@@ -1,12 +1,99 @@
-from django.contrib import admin
+import logging
+from decimal import Decimal
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME, ActionForm
+from django.core.exceptions import ValidationError
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.db.models.functions import Round
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Book, BookReview
+from .forms import StockFormMixin
+from .isbn import normalize_isbn
+from .models import Book, BookArchive, BookReview, PendingReview, ReviewArchive
+from .paginators import EstimatedCountPaginator
+from .projections import TABLE_FIELDS
+from .sharding import review_databases, shard_count, shard_for_book
+
+logger = logging.getLogger(__name__)
+
+
+class BookActionForm(ActionForm):
+    """Дополнительные параметры для пакетных действий над книгами"""
+    percent = forms.DecimalField(
+        label='Изменение цены, %',
+        required=False,
+        max_digits=5,
+        decimal_places=1,
+        min_value=Decimal('-99.9'),
+        max_value=Decimal('1000')
+    )
+    genre = forms.ChoiceField(
+        label='Жанр',
+        required=False,
+        choices=[('', '---------')] + Book.GENRE_CHOICES
+    )
+    quantity = forms.IntegerField(
+        label='Количество',
+        required=False,
+        min_value=0
+    )
+    shards = forms.IntegerField(
+        label='Счетчиков остатка',
+        required=False,
+        min_value=0,
+        max_value=64
+    )
+
+
+class BookAdminForm(StockFormMixin, forms.ModelForm):
+    class Meta:
+        model = Book
+        fields = '__all__'
+
+
+class PublicationDecadeFilter(admin.SimpleListFilter):
+    """Фильтр по десятилетиям издания без DISTINCT-запроса по таблице"""
+    title = 'Год издания'
+    parameter_name = 'decade'
+
+    def lookups(self, request, model_admin):
+        return [(str(decade), f'{decade}-е') for decade in range(1800, 2100, 10)][::-1]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            decade = int(self.value())
+            return queryset.filter(
+                publication_year__gte=decade,
+                publication_year__lt=decade + 10
+            )
+        return queryset
+
+
+class RecentReviewsFormSet(BaseInlineFormSet):
+    """Показывает в карточке книги только последние отзывы"""
+    limit = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_recent_queryset'):
+            queryset = super().get_queryset()
+            if self.instance.pk is not None:
+                # Отзывы книги лежат в ее шарде (book.sharding)
+                queryset = queryset.using(shard_for_book(self.instance.pk))
+            recent_ids = list(queryset.values_list('pk', flat=True)[:self.limit])
+            self._recent_queryset = queryset.filter(pk__in=recent_ids)
+        return self._recent_queryset
 
 
 class BookReviewInline(admin.TabularInline):
-    """Inline для отображения отзывов"""
+    """Inline для отображения последних отзывов (полный список - в разделе отзывов)"""
     model = BookReview
+    formset = RecentReviewsFormSet
     extra = 0
+    show_change_link = True
     readonly_fields = ['created_at']
     fields = ['reviewer_name', 'email', 'rating', 'text', 'is_approved', 'created_at']
     classes = ['collapse']
@@ -15,6 +102,7 @@ class BookReviewInline(admin.TabularInline):
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     """Админ-панель для книг"""
+    form = BookAdminForm
 
     # Отображение в списке
     list_display = [
@@ -23,19 +111,24 @@ class BookAdmin(admin.ModelAdmin):
         'is_available_display', 'created_at_short'
     ]
 
-    # Фильтры
+    # Фильтры (даты - через date_hierarchy, годы - фиксированными диапазонами)
     list_filter = [
         'genre',
         'is_available',
-        'created_at',
-        'publication_year'
+        PublicationDecadeFilter
     ]
+    date_hierarchy = 'created_at'
 
-    # Поиск
+    # Поиск по префиксу названия и автора (индексы из миграции 0013) и по
+    # ISBN (get_search_results); полнотекстового поиска по описанию нет
     search_fields = [
-        'title', 'author', 'isbn', 'short_description'
+        '^title', '^author'
     ]
 
+    # Пагинация без полного COUNT(*) по таблице
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     # Редактирование (убрали поля, которых нет в модели)
     fieldsets = (
         ('Основная информация', {
@@ -48,7 +141,7 @@ class BookAdmin(admin.ModelAdmin):
             'fields': ('short_description', 'reading_reason', 'rating')
         }),
         ('Цена и наличие', {
-            'fields': ('price_rub', 'is_available')
+            'fields': ('price_rub', 'stock', 'is_available', 'stock_counters_display')
         }),
         ('Обложка', {
             'fields': ('cover_image',),
@@ -60,13 +153,27 @@ class BookAdmin(admin.ModelAdmin):
         }),
     )
 
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'is_available', 'stock_counters_display']
 
     # Inline
     inlines = [BookReviewInline]
 
     # Действия
-    actions = ['make_available', 'make_unavailable']
+    actions = [
+        'set_stock', 'add_stock', 'make_unavailable', 'split_stock',
+        'change_price', 'change_genre', 'merge_duplicates', 'delete_in_batches'
+    ]
+    action_form = BookActionForm
+
+    # Сколько групп дубликатов показывать на странице подтверждения
+    merge_preview_groups = 50
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # В списке не нужны длинные текстовые поля, форма редактирования грузит все
+        if request.resolver_match and request.resolver_match.url_name.endswith('changelist'):
+            queryset = queryset.only(*TABLE_FIELDS, 'created_at')
+        return queryset
 
     # Кастомные методы отображения
     def genre_display(self, obj):
@@ -93,30 +200,335 @@ class BookAdmin(admin.ModelAdmin):
 
     is_available_display.short_description = 'В наличии'
 
+    def stock_counters_display(self, obj):
+        if not obj.stock_shards:
+            return '-'
+        return f'{obj.available_stock} шт. в {obj.stock_shards} счетчиках'
+
+    stock_counters_display.short_description = 'Остаток в счетчиках'
+
+    def get_search_results(self, request, queryset, search_term):
+        isbn = normalize_isbn(search_term)
+        if isbn is None:
+            return super().get_search_results(request, queryset, search_term)
+        # Точное совпадение по уникальному индексу, в любом написании ISBN.
+        # Условие не объединяется через OR с LIKE: иначе SQLite не использует индексы
+        return queryset.filter(isbn_normalized=isbn), False
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = super().get_readonly_fields(request, obj)
+        if obj is not None and obj.stock_shards:
+            # Остаток таких книг меняется только через счетчики (book.stock)
+            readonly_fields = [*readonly_fields, 'stock']
+        return readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        # Остаток меняется на разницу из формы (forms.StockFormMixin)
+        form.save_book()
+
     def created_at_short(self, obj):
         return obj.created_at.strftime('%d.%m.%Y')
 
     created_at_short.short_description = 'Добавлена'
 
-    # Кастомные действия
-    def make_available(self, request, queryset):
-        updated = queryset.update(is_available=True)
-        self.message_user(request, f'{updated} книг помечены как доступные')
+    # Кастомные действия (book.bulk импортируется в них самих, чтобы не
+    # загружать его при каждом запуске manage.py и воркера)
+    def set_stock(self, request, queryset):
+        from .stock import set_stock_in_batches
+
+        quantity = self._action_param(request, 'quantity')
+        if quantity is None:
+            self.message_user(request, 'Укажите количество', messages.ERROR)
+            return
+        updated = set_stock_in_batches(queryset, quantity, progress=self._log_progress)
+        self.message_user(request, f'Остаток {quantity} шт. установлен у {updated} книг')
+
+    set_stock.short_description = 'Установить остаток'
+    set_stock.allowed_permissions = ('change',)
 
-    make_available.short_description = 'Сделать доступными'
+    def add_stock(self, request, queryset):
+        from .stock import add_stock_in_batches
+
+        quantity = self._action_param(request, 'quantity')
+        if not quantity:
+            self.message_user(request, 'Укажите количество', messages.ERROR)
+            return
+        updated = add_stock_in_batches(queryset, quantity, progress=self._log_progress)
+        self.message_user(request, f'{quantity} шт. добавлено к остатку {updated} книг')
+
+    add_stock.short_description = 'Поставка: добавить к остатку'
+    add_stock.allowed_permissions = ('change',)
 
     def make_unavailable(self, request, queryset):
-        updated = queryset.update(is_available=False)
-        self.message_user(request, f'{updated} книг помечены как недоступные')
+        from .stock import set_stock_in_batches
+
+        updated = set_stock_in_batches(queryset, 0, progress=self._log_progress)
+        self.message_user(request, f'{updated} книг сняты с продажи (остаток обнулен)')
+
+    make_unavailable.short_description = 'Снять с продажи'
+    make_unavailable.allowed_permissions = ('change',)
+
+    def split_stock(self, request, queryset):
+        from .stock import set_stock_shards
+
+        shards = self._action_param(request, 'shards')
+        if shards is None:
+            self.message_user(request, 'Укажите количество счетчиков', messages.ERROR)
+            return
+        book_ids = list(queryset.values_list('pk', flat=True))
+        for book_id in book_ids:
+            set_stock_shards(book_id, shards)
+        if shards:
+            self.message_user(request, f'Остаток {len(book_ids)} книг разделен на {shards} счетчиков')
+        else:
+            self.message_user(request, f'Остаток {len(book_ids)} книг перенесен из счетчиков в карточку книги')
+
+    split_stock.short_description = 'Разделить остаток на счетчики (0 - объединить)'
+    split_stock.allowed_permissions = ('change',)
+
+    def change_price(self, request, queryset):
+        from .bulk import update_in_batches
+
+        percent = self._action_param(request, 'percent')
+        if percent is None:
+            self.message_user(request, 'Укажите изменение цены в процентах', messages.ERROR)
+            return
+        factor = 1 + percent / 100
+        updated = update_in_batches(
+            queryset,
+            progress=self._log_progress,
+            price_rub=Round(
+                ExpressionWrapper(F('price_rub') * factor, output_field=DecimalField()),
+                2
+            )
+        )
+        self.message_user(request, f'Цена изменена на {percent}% у {updated} книг')
+
+    change_price.short_description = 'Изменить цену на указанный процент'
+    change_price.allowed_permissions = ('change',)
+
+    def change_genre(self, request, queryset):
+        from .bulk import update_in_batches
+
+        genre = self._action_param(request, 'genre')
+        if not genre:
+            self.message_user(request, 'Выберите жанр', messages.ERROR)
+            return
+        updated = update_in_batches(queryset, progress=self._log_progress, genre=genre)
+        self.message_user(
+            request,
+            f'{updated} книг перенесены в жанр "{dict(Book.GENRE_CHOICES)[genre]}"'
+        )
+
+    change_genre.short_description = 'Сменить жанр'
+    change_genre.allowed_permissions = ('change',)
+
+    def merge_duplicates(self, request, queryset):
+        from .duplicates import find_duplicates, merge_books
+
+        # Сливаются только группы, которые find_duplicates признает дубликатами
+        groups = find_duplicates(queryset)
+        if not groups:
+            self.message_user(request, 'Среди выбранных книг нет дубликатов', messages.WARNING)
+            return
+        grouped = sum(len(group) for group in groups)
+        skipped = queryset.count() - grouped
+        if not request.POST.get('post'):
+            shown = groups[:self.merge_preview_groups]
+            books = Book.objects.only('title', 'author').in_bulk([pk for group in shown for pk in group])
+            summary = [
+                f'#{keeper_id} {books[keeper_id]} <- '
+                + ', '.join(f'#{pk} {books[pk]}' for pk in duplicate_ids)
+                for keeper_id, *duplicate_ids in shown
+            ]
+            if len(groups) > len(shown):
+                summary.append(f'... и еще групп: {len(groups) - len(shown)}')
+            if skipped:
+                summary.append(f'Книг без дубликатов среди выбранных (не изменятся): {skipped}')
+            return self._confirm_action(
+                request, 'merge_duplicates',
+                title='Объединение дубликатов',
+                question=f'Объединить {grouped} книг в {len(groups)} групп? '
+                         f'Отзывы, остаток и ISBN перейдут к первой книге группы, остальные будут удалены.',
+                summary=summary,
+                warning='Удаленные дубликаты восстановить нельзя.'
+            )
+        moved = 0
+        for keeper_id, *duplicate_ids in groups:
+            moved += merge_books(keeper_id, duplicate_ids)
+        self.message_user(
+            request,
+            f'Объединено групп: {len(groups)}, удалено дубликатов: {grouped - len(groups)}, '
+            f'перенесено отзывов: {moved}'
+        )
+        if skipped:
+            self.message_user(request, f'Книг без дубликатов пропущено: {skipped}', messages.WARNING)
 
-    make_unavailable.short_description = 'Сделать недоступными'
+    merge_duplicates.short_description = 'Объединить дубликаты (в самую раннюю книгу)'
+    # Django проверяет allowed_permissions через "любое из", а слиянию нужны оба права
+    merge_duplicates.allowed_permissions = ('merge',)
+
+    def has_merge_permission(self, request):
+        return self.has_change_permission(request) and self.has_delete_permission(request)
+
+    def delete_in_batches(self, request, queryset):
+        from .bulk import count_for_delete, delete_in_batches
+
+        if not request.POST.get('post'):
+            books, reviews, archived = count_for_delete(queryset)
+            return self._confirm_action(
+                request, 'delete_in_batches',
+                title='Удаление книг пачками',
+                question='Удалить выбранные книги вместе с отзывами (и архивными), историей цен '
+                         'и счетчиками остатка?',
+                summary=[f'Книг: {books}', f'Отзывов: {reviews}', f'Отзывов в архиве: {archived}'],
+                warning='Строки удаляются напрямую: сигналы не отправляются, '
+                        'записи в журнал админки не создаются, отменить удаление нельзя.'
+            )
+        deleted = delete_in_batches(queryset, progress=self._log_progress)
+        self.message_user(request, f'{deleted} книг удалены вместе с отзывами')
+
+    delete_in_batches.short_description = 'Удалить пачками (без загрузки объектов)'
+    delete_in_batches.allowed_permissions = ('delete',)
+
+    def _confirm_action(self, request, action, title, question, summary, warning=None):
+        """Страница подтверждения действия, как у delete_selected
+
+        Форма отправляется на тот же адрес (с фильтрами списка) с post=yes;
+        при "выбрать все" передается select_across, и действие снова
+        получает весь отфильтрованный queryset.
+        """
+        context = {
+            **self.admin_site.each_context(request),
+            'title': title,
+            'subtitle': None,
+            'opts': self.model._meta,
+            'media': self.media,
+            'question': question,
+            'summary': summary,
+            'warning': warning,
+            'action': action,
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+            'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, 'admin/book/book/action_confirmation.html', context)
+
+    def _action_param(self, request, name):
+        """Значение дополнительного поля формы действий или None"""
+        field = self.action_form.base_fields[name]
+        try:
+            return field.clean(request.POST.get(name))
+        except ValidationError:
+            return None
+
+    def _log_progress(self, batch_number, total):
+        logger.info('Пакетная операция: пачка %s, обработано строк %s', batch_number, total)
+
+
+class ReviewShardFilter(admin.SimpleListFilter):
+    """База отзывов для списка в режиме шардирования; по умолчанию - первая"""
+    title = 'База отзывов'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in review_databases()]
+
+    def value(self):
+        return super().value() or review_databases()[0]
+
+    def choices(self, changelist):
+        # Варианта "Все" нет: список читает одну базу
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == alias,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # База уже выбрана в ReviewShardAdminMixin.get_queryset
+        return queryset
+
+
+class ReviewShardAdminMixin:
+    """Админка отзывов в режиме шардирования (book.sharding)
+
+    Роутер отправляет запросы без подсказки о книге в основную базу, где
+    отзывов нет. Поэтому список читает один шард (фильтр "База отзывов"),
+    отзыв для редактирования ищется по всем шардам, книги подгружаются
+    из основной базы отдельным запросом, а поиск по названию книги
+    выполняется через ID найденных в основной базе книг.
+    """
+    # Сколько книг с подходящим названием учитывать в поиске отзывов
+    search_books_limit = 1000
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not shard_count():
+            return queryset
+        alias = request.GET.get(ReviewShardFilter.parameter_name)
+        if alias not in review_databases():
+            alias = review_databases()[0]
+        return queryset.using(alias).prefetch_related('book')
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if shard_count():
+            return [ReviewShardFilter, *list_filter]
+        return list_filter
+
+    def get_list_select_related(self, request):
+        if shard_count():
+            # Пустой список, а не False: при False Django сам добавит JOIN с книгой
+            return ()
+        return super().get_list_select_related(request)
+
+    def get_search_fields(self, request):
+        search_fields = super().get_search_fields(request)
+        if shard_count():
+            return [field for field in search_fields if not field.lstrip('^=@').startswith('book__')]
+        return search_fields
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if shard_count() and search_term:
+            book_ids = list(
+                Book.objects.filter(title__istartswith=search_term).values_list(
+                    'pk', flat=True
+                )[:self.search_books_limit]
+            )
+            if book_ids:
+                results |= queryset.filter(book_id__in=book_ids)
+        return results, may_have_duplicates
+
+    def get_object(self, request, object_id, from_field=None):
+        if not shard_count():
+            return super().get_object(request, object_id, from_field)
+        field = self.opts.pk if from_field is None else self.opts.get_field(from_field)
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        # ID отзывов уникальны по всем шардам (sharding.reserve_review_ids)
+        queryset = super().get_queryset(request)
+        for alias in review_databases():
+            obj = queryset.using(alias).filter(**{field.name: object_id}).first()
+            if obj is not None:
+                return obj
+        return None
 
 
 @admin.register(BookReview)
-class BookReviewAdmin(admin.ModelAdmin):
+class BookReviewAdmin(ReviewShardAdminMixin, admin.ModelAdmin):
     list_display = ['book', 'reviewer_name', 'rating_display', 'is_approved', 'created_at_short']
-    list_filter = ['rating', 'is_approved', 'created_at']
-    search_fields = ['book__title', 'reviewer_name', 'text']
+    list_filter = ['rating', 'is_approved']
+    date_hierarchy = 'created_at'
+    search_fields = ['^book__title', '^reviewer_name', '=email']
+    list_select_related = ['book']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_editable = ['is_approved']
     readonly_fields = ['created_at']
 
@@ -128,4 +540,87 @@ class BookReviewAdmin(admin.ModelAdmin):
     def created_at_short(self, obj):
         return obj.created_at.strftime('%d.%m.%Y %H:%M')
 
-    created_at_short.short_description = 'Дата'
\ No newline at end of file
+    created_at_short.short_description = 'Дата'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Одобрение или правка отзыва меняет страницу книги (prerender)
+        Book.objects.filter(pk=obj.book_id).update(updated_at=timezone.now())
+
+
+@admin.register(PendingReview)
+class PendingReviewAdmin(ReviewShardAdminMixin, admin.ModelAdmin):
+    """Очередь модерации: неодобренные отзывы по всем книгам"""
+    list_display = ['book', 'reviewer_name', 'rating', 'text_preview', 'created_at']
+    list_select_related = ['book']
+    list_per_page = 50
+    ordering = ['created_at']
+    search_fields = ['^book__title', '^reviewer_name']
+    readonly_fields = ['created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['approve', 'reject']
+
+    def text_preview(self, obj):
+        return obj.text[:100]
+
+    text_preview.short_description = 'Текст'
+
+    def approve(self, request, queryset):
+        book_ids = set(queryset.values_list('book_id', flat=True))
+        updated = queryset.update(is_approved=True)
+        # Страницы книг изменились: дата обновления нужна prerender и ленте изменений
+        Book.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+        self.message_user(request, f'{updated} отзывов одобрены')
+
+    approve.short_description = 'Одобрить'
+    approve.allowed_permissions = ('change',)
+
+    def reject(self, request, queryset):
+        deleted, _ = queryset.delete()
+        self.message_user(request, f'{deleted} отзывов отклонены и удалены')
+
+    reject.short_description = 'Отклонить и удалить'
+    reject.allowed_permissions = ('delete',)
+
+
+@admin.register(BookArchive)
+class BookArchiveAdmin(admin.ModelAdmin):
+    """Архив книг (команда archive); данные книги хранятся сжатыми"""
+    list_display = ['book_id', 'title', 'author', 'genre', 'reviews_analyzed', 'archived_at']
+    list_filter = ['genre']
+    search_fields = ['^title', '^author', '=book_id']
+    date_hierarchy = 'archived_at'
+    exclude = ['data']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['restore']
+
+    def has_add_permission(self, request):
+        return False
+
+    # Право на изменение нужно только действию restore, сами записи только для чтения
+    def has_change_permission(self, request, obj=None):
+        return obj is None and super().has_change_permission(request)
+
+    # Удаление книги из архива удаляет и ее архивные отзывы
+    def delete_model(self, request, obj):
+        segments = ReviewArchive.objects.filter(book_id=obj.book_id)
+        segments._raw_delete(segments.db)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        segments = ReviewArchive.objects.filter(book_id__in=list(queryset.values_list('book_id', flat=True)))
+        segments._raw_delete(segments.db)
+        super().delete_queryset(request, queryset)
+
+    def restore(self, request, queryset):
+        from .archive import restore_book
+
+        book_ids = list(queryset.values_list('book_id', flat=True))
+        for book_id in book_ids:
+            restore_book(book_id)
+        self.message_user(request, f'{len(book_ids)} книг возвращены в каталог')
+
+    restore.short_description = 'Вернуть в каталог'
+    restore.allowed_permissions = ('change',)
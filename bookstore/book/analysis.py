@@ -0,0 +1,136 @@
+"""Анализ текстов отзывов: токенизация, тональность по словарю, TF-IDF
+
+Функции analyze_batch и tokenize не обращаются к Django и могут
+выполняться в дочерних процессах (см. команду analyze_reviews).
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}')
+
+# Для словаря тональности слова сокращаются до основы фиксированной
+# длины - грубая замена морфологии, не требующая внешних библиотек
+STEM_LENGTH = 6
+
+STOP_WORDS = frozenset("""
+    это этот эта эти как так что чтобы когда где был была были было будет
+    его она они оно для при про без над под или если еще уже только очень
+    все всё весь вся всех мне меня мой моя нас наш вас ваш них ним ней
+    книга книгу книги книге автор автора читать прочитал прочитала
+    the and for with this that was were are have has had not but you
+    book read author from they their there very just all its
+""".split())
+
+POSITIVE_WORDS = """
+    отличн прекрасн замечательн великолепн хорош интересн увлекательн
+    понравил нравит люблю любим восторг шедевр рекоменд советую лучш
+    глубок трогательн захватыва ярк тепл смешн добр гениальн
+    great excellent amazing wonderful good love loved like best brilliant
+    beautiful interesting recommend enjoyed favorite masterpiece
+""".split()
+
+NEGATIVE_WORDS = """
+    плох скучн ужасн неинтересн разочаров слаб затянут нудн глуп
+    бездарн отвратительн хуже худш пуст банальн жаль устал бросил
+    bad boring awful terrible worst weak dull disappointing hate hated
+    waste poor
+""".split()
+
+NEGATIONS = frozenset(['не', 'нет', 'ни', 'not', 'no', 'never'])
+
+
+def stem(word):
+    return word[:STEM_LENGTH]
+
+
+LEXICON = {stem(word): 1 for word in POSITIVE_WORDS}
+LEXICON.update({stem(word): -1 for word in NEGATIVE_WORDS})
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def sentiment(tokens):
+    """Тональность от -1 до 1: доля позитивных слов минус доля негативных
+
+    Отрицание непосредственно перед словом меняет его знак.
+    """
+    score = 0
+    hits = 0
+    negate = False
+    for token in tokens:
+        if token in NEGATIONS:
+            negate = True
+            continue
+        value = LEXICON.get(stem(token))
+        if value:
+            score += -value if negate else value
+            hits += 1
+        negate = False
+    return score / hits if hits else 0.0
+
+
+def terms(tokens):
+    """Частоты значимых слов для TF-IDF"""
+    return Counter(
+        token for token in tokens
+        if len(token) >= 3 and token not in STOP_WORDS
+    )
+
+
+def analyze_batch(rows):
+    """Обрабатывает пачку [(review_id, book_id, text)] в одном процессе
+
+    Возвращает [(review_id, book_id, sentiment, Counter слов)].
+    """
+    results = []
+    for review_id, book_id, text in rows:
+        tokens = tokenize(text)
+        results.append((review_id, book_id, sentiment(tokens), terms(tokens)))
+    return results
+
+
+def top_keywords(term_counts, document_frequency, documents, limit=10):
+    """Ключевые слова книги по TF-IDF (документ - все отзывы одной книги)"""
+    total = sum(term_counts.values())
+    if not total:
+        return []
+    scores = {
+        term: count / total * math.log((1 + documents) / (1 + document_frequency.get(term, 0)))
+        for term, count in term_counts.items()
+    }
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [term for term, score in ranked[:limit] if score > 0]
+
+
+def forget_reviews(reviews):
+    """Снимает вклад отзывов из BookTextAnalysis их книг
+
+    reviews - [(book_id, text, sentiment)] учтенных анализом отзывов, которые
+    удалены, отклонены или изменены. Слова, которых больше нет в отзывах
+    книги, сразу убираются из ключевых слов; TF-IDF остальных пересчитает
+    команда analyze_reviews (флаг keywords_outdated).
+    """
+    from django.db import transaction
+
+    from .models import BookTextAnalysis
+
+    by_book = defaultdict(list)
+    for book_id, text, score in reviews:
+        by_book[book_id].append((terms(tokenize(text)), score))
+    with transaction.atomic():
+        for analysis in BookTextAnalysis.objects.select_for_update().filter(book_id__in=by_book):
+            counts = Counter(analysis.term_counts)
+            for review_terms, score in by_book[analysis.book_id]:
+                counts.subtract(review_terms)
+                analysis.sentiment_sum -= score
+                analysis.reviews_analyzed = max(analysis.reviews_analyzed - 1, 0)
+            if not analysis.reviews_analyzed:
+                analysis.sentiment_sum = 0
+            analysis.term_counts = {term: count for term, count in counts.items() if count > 0}
+            analysis.keywords = [term for term in analysis.keywords if term in analysis.term_counts]
+            analysis.keywords_outdated = True
+            analysis.save()
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BookConfig(AppConfig):
@@ -11,4 +12,7 @@ class BookConfig(AppConfig):
         try:
             import book.signals
         except ImportError:
-            pass
\ No newline at end of file
+            pass
+
+        from book.sharding import reserve_review_ids
+        post_migrate.connect(reserve_review_ids, sender=self)
\ No newline at end of file
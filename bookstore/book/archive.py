@@ -0,0 +1,213 @@
+"""Архив старых отзывов и давно отсутствующих в продаже книг
+
+Команда archive переносит пачками:
+- одобренные отзывы старше ARCHIVE_REVIEWS_AFTER_DAYS в сегменты
+  ReviewArchive (сжатый JSON, один сегмент на книгу в пачке). Переносятся
+  только отзывы, уже учтенные analyze_reviews, поэтому накопленные
+  тональность и ключевые слова (BookTextAnalysis) не меняются;
+- книги, которые не продаются и не менялись ARCHIVE_BOOKS_AFTER_DAYS,
+  в BookArchive вместе с историей цен, результатами анализа и всеми
+  отзывами. Дневные сводки цен (GenrePriceDaily) остаются как есть.
+
+Каждая пачка переносится в своей транзакции, удаление из рабочих таблиц
+выполняется одним DELETE по первичным ключам. Страница книги и подгрузка
+отзывов читают архив, когда рабочих строк нет.
+
+Сегменты отзывов живут, пока жива книга в каталоге или в архиве:
+удаление книги (в том числе из BookArchive) удаляет и их, при слиянии
+дубликатов (book.duplicates) они переходят к оставшейся книге.
+"""
+import json
+import zlib
+from collections import Counter, defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Sum
+
+from .isbn import normalize_isbn
+from .models import (
+    Book, BookArchive, BookPriceHistory, BookReview, BookTextAnalysis, ReviewArchive,
+)
+from .sharding import review_databases
+
+BATCH_SIZE = 500
+
+
+def pack(payload, stats):
+    """Сжатый JSON; в stats добавляются размеры до и после сжатия"""
+    raw = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+    data = zlib.compress(raw, 6)
+    stats['raw_bytes'] += len(raw)
+    stats['archive_bytes'] += len(data)
+    return data
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def restore_instance(model, values):
+    """Несохраненный экземпляр модели из словаря values() после JSON"""
+    return model(**{
+        field.attname: field.to_python(values[field.attname])
+        for field in model._meta.concrete_fields
+        if field.attname in values
+    })
+
+
+def review_segments(rows, stats):
+    """Сегменты ReviewArchive для строк values() отзывов, по одному на книгу"""
+    by_book = defaultdict(list)
+    for row in rows:
+        by_book[row['book_id']].append(row)
+
+    segments = []
+    for book_id, reviews in by_book.items():
+        approved = [review for review in reviews if review['is_approved']]
+        segments.append(ReviewArchive(
+            book_id=book_id,
+            reviews_count=len(reviews),
+            approved_count=len(approved),
+            rating_sum=sum(review['rating'] for review in approved),
+            oldest_at=min(review['created_at'] for review in reviews),
+            newest_at=max(review['created_at'] for review in reviews),
+            data=pack(reviews, stats)
+        ))
+    return segments
+
+
+def archive_reviews(before, batch_size=BATCH_SIZE, progress=None):
+    """Переносит в архив одобренные проанализированные отзывы, созданные до before"""
+    stats = Counter()
+    for alias in review_databases():
+        reviews = BookReview.objects.using(alias).filter(
+            created_at__lt=before, is_approved=True, sentiment__isnull=False
+        ).order_by('pk')
+        last_pk = 0
+        while True:
+            rows = list(reviews.filter(pk__gt=last_pk).values()[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1]['id']
+            # Для шардов - две транзакции: архив фиксируется первым (вложенная),
+            # при сбое между ними отзыв окажется и в архиве, но не потеряется
+            with transaction.atomic(using=alias), transaction.atomic():
+                ReviewArchive.objects.bulk_create(review_segments(rows, stats))
+                moved = BookReview.objects.using(alias).filter(pk__in=[row['id'] for row in rows])
+                stats['reviews'] += moved._raw_delete(alias)
+            if progress:
+                progress('reviews', stats['reviews'])
+    return stats
+
+
+def archive_books(before, batch_size=BATCH_SIZE, progress=None):
+    """Переносит в архив книги не в продаже, не менявшиеся с before"""
+    from .bulk import delete_in_batches, iter_pk_batches
+
+    stats = Counter()
+    queryset = Book.objects.filter(is_available=False, updated_at__lt=before)
+    for batch in iter_pk_batches(queryset, batch_size):
+        books = list(Book.objects.filter(pk__in=batch).values())
+        history = defaultdict(list)
+        for row in BookPriceHistory.objects.filter(book_id__in=batch).order_by('pk').values():
+            history[row['book_id']].append(row)
+        analyses = {row['book_id']: row for row in BookTextAnalysis.objects.filter(book_id__in=batch).values()}
+        reviews = []
+        for alias in review_databases():
+            reviews += BookReview.objects.using(alias).filter(book_id__in=batch).values()
+
+        archived = []
+        for book in books:
+            analysis = analyses.get(book['id'])
+            archived.append(BookArchive(
+                book_id=book['id'],
+                title=book['title'],
+                author=book['author'],
+                genre=book['genre'],
+                sentiment_sum=analysis['sentiment_sum'] if analysis else 0,
+                reviews_analyzed=analysis['reviews_analyzed'] if analysis else 0,
+                data=pack({'book': book, 'history': history[book['id']], 'analysis': analysis}, stats)
+            ))
+
+        with transaction.atomic():
+            BookArchive.objects.bulk_create(archived)
+            ReviewArchive.objects.bulk_create(review_segments(reviews, stats))
+            # Отзывы, история, анализ и отметки об удалении для ленты изменений
+            stats['books'] += delete_in_batches(
+                Book.objects.filter(pk__in=batch), batch_size, keep_archived_reviews=True
+            )
+        stats['book_reviews'] += len(reviews)
+        if progress:
+            progress('books', stats['books'])
+    return stats
+
+
+def get_archived_book(book_id):
+    """Книга из архива (несохраненный экземпляр Book) или None
+
+    Результаты анализа отзывов доступны в атрибуте archived_analysis.
+    """
+    archive = BookArchive.objects.filter(book_id=book_id).first()
+    if archive is None:
+        return None
+    payload = unpack(archive.data)
+    book = restore_instance(Book, payload['book'])
+    book.archived_at = archive.archived_at
+    book.archived_analysis = (
+        restore_instance(BookTextAnalysis, payload['analysis']) if payload['analysis'] else None
+    )
+    return book
+
+
+def archived_reviews(book_id, before=None, limit=None):
+    """Одобренные отзывы книги из архива, новые первыми
+
+    before - позиция (created_at, id) из курсора reviews.parse_cursor.
+    Распаковываются только сегменты, в которых могут быть такие отзывы.
+    """
+    segments = ReviewArchive.objects.filter(book_id=book_id, approved_count__gt=0)
+    if before:
+        segments = segments.filter(oldest_at__lte=before[0])
+
+    reviews = []
+    for data in segments.values_list('data', flat=True):
+        for values in unpack(data):
+            review = restore_instance(BookReview, values)
+            if not review.is_approved:
+                continue
+            # После слияния дубликатов сегмент принадлежит другой книге
+            review.book_id = book_id
+            if before and (review.created_at, review.pk) >= before:
+                continue
+            reviews.append(review)
+    reviews.sort(key=lambda review: (review.created_at, review.pk), reverse=True)
+    return reviews[:limit] if limit else reviews
+
+
+def archived_reviews_count(book_id):
+    return ReviewArchive.objects.filter(book_id=book_id).aggregate(
+        total=Sum('approved_count')
+    )['total'] or 0
+
+
+def restore_book(book_id):
+    """Возвращает книгу из архива в каталог (отзывы остаются в архиве)"""
+    archive = BookArchive.objects.get(book_id=book_id)
+    payload = unpack(archive.data)
+    book = restore_instance(Book, payload['book'])
+    if Book.objects.filter(isbn_normalized=normalize_isbn(book.isbn)).exclude(isbn_normalized=None).exists():
+        # ISBN за время архивации получила другая книга
+        book.isbn = None
+
+    with transaction.atomic():
+        book.save(force_insert=True)
+        # auto_now_add при вставке заменяет исходную дату добавления
+        Book.objects.filter(pk=book.pk).update(created_at=payload['book']['created_at'])
+        BookPriceHistory.objects.bulk_create(
+            restore_instance(BookPriceHistory, row) for row in payload['history']
+        )
+        if payload['analysis']:
+            restore_instance(BookTextAnalysis, payload['analysis']).save(force_insert=True)
+        archive.delete()
+    return book
@@ -0,0 +1,95 @@
+"""Пакетные операции над книгами
+
+Изменения выполняются set-based запросами UPDATE/DELETE по пачкам
+первичных ключей, каждая пачка - в отдельной транзакции, чтобы не
+держать блокировку таблицы на время всей операции.
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .history import record_changes
+from .models import Book, BookPriceHistory, BookStockShard, BookTextAnalysis, BookTombstone, ReviewArchive
+from .sharding import count_reviews, delete_reviews
+from . import sidebars
+
+BATCH_SIZE = 1000
+
+
+def iter_pk_batches(queryset, batch_size=BATCH_SIZE):
+    """Выдает списки первичных ключей пачками по возрастанию pk"""
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        batch_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(batch_qs[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def update_in_batches(queryset, batch_size=BATCH_SIZE, progress=None, **values):
+    """UPDATE выбранных книг пачками, возвращает число измененных строк"""
+    track_history = bool(set(values) & {'genre', *Book.HISTORY_FIELDS})
+    updated = 0
+    for number, batch in enumerate(iter_pk_batches(queryset, batch_size), 1):
+        with transaction.atomic(using=queryset.db):
+            # update() не заполняет поля auto_now, поэтому дата обновления
+            # ставится явно - своя у каждой пачки, в ее транзакции: иначе
+            # поздние пачки фиксируются с давней датой и лента изменений
+            # (book.changes) может их пропустить
+            batch_values = {'updated_at': timezone.now(), **values}
+            books = Book.objects.using(queryset.db).filter(pk__in=batch)
+            updated += books.update(**batch_values)
+            if track_history:
+                record_changes(
+                    books.values_list('pk', 'genre', 'price_rub', 'is_available'),
+                    changed_at=batch_values['updated_at']
+                )
+        if progress:
+            progress(number, updated)
+    sidebars.invalidate()
+    return updated
+
+
+def count_for_delete(queryset, batch_size=BATCH_SIZE):
+    """Сколько книг, отзывов и архивных отзывов удалит delete_in_batches (для подтверждения)"""
+    books = reviews = archived = 0
+    for batch in iter_pk_batches(queryset, batch_size):
+        books += len(batch)
+        reviews += count_reviews(batch)
+        archived += ReviewArchive.objects.filter(book_id__in=batch).aggregate(
+            total=Sum('reviews_count')
+        )['total'] or 0
+    return books, reviews, archived
+
+
+def delete_in_batches(queryset, batch_size=BATCH_SIZE, progress=None, keep_archived_reviews=False):
+    """Удаление книг вместе с отзывами без загрузки объектов в память
+
+    Каскад выполняется напрямую: сначала DELETE отзывов, истории цен,
+    результатов анализа, счетчиков остатка и сегментов архива отзывов
+    пачки, затем DELETE самих книг. Сигналы delete для строк не отправляются,
+    отметки об удалении для ленты изменений пишутся здесь же.
+    keep_archived_reviews - сегменты архива остаются (архивация книг).
+    """
+    related_models = [BookPriceHistory, BookTextAnalysis, BookStockShard]
+    if not keep_archived_reviews:
+        related_models.append(ReviewArchive)
+    deleted = 0
+    for number, batch in enumerate(iter_pk_batches(queryset, batch_size), 1):
+        with transaction.atomic(using=queryset.db):
+            delete_reviews(batch)
+            for model in related_models:
+                related = model.objects.using(queryset.db).filter(book_id__in=batch)
+                related._raw_delete(related.db)
+            books = Book.objects.using(queryset.db).filter(pk__in=batch)
+            deleted += books._raw_delete(books.db)
+            BookTombstone.objects.using(queryset.db).bulk_create(
+                BookTombstone(book_id=pk) for pk in batch
+            )
+        if progress:
+            progress(number, deleted)
+    sidebars.invalidate()
+    return deleted
@@ -0,0 +1,98 @@
+"""Лента изменений каталога для инкрементальной синхронизации
+
+Курсор - позиция в общем порядке изменений (время, вид, id): книги
+упорядочены по (updated_at, pk), отметки об удалении - по (deleted_at, pk),
+при равном времени книги идут раньше удалений. В запросе курсор передается
+строкой "<время ISO 8601>|<вид>|<id>"; просто время (первый запрос клиента,
+курсоры прежнего формата) означает все изменения начиная с этого момента.
+
+Ответ содержит изменения после курсора, но не позже until = сейчас минус
+SAFETY_LAG: дата изменения ставится до фиксации транзакции, и строки с
+более свежими датами могут быть еще не видны. Лента отдается страницами;
+книга, измененная повторно, приходит снова - клиент обновляет запись по id.
+Выборки идут по индексам на Book.updated_at и BookTombstone.deleted_at.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Book, BookTombstone
+
+# Запас на транзакции, которые еще не зафиксированы (пачки в bulk короткие)
+SAFETY_LAG = timedelta(seconds=60)
+
+# Размер страницы ленты: книги и удаления вместе
+PAGE_SIZE = 1000
+
+# Виды записей в позиции курсора; -1 - до всех записей этого момента
+BOOK, TOMBSTONE = 0, 1
+START = -1
+
+
+def parse_since(value):
+    """Разбирает курсор из запроса в (время, вид, id), при ошибке возвращает None"""
+    moment, _, position = (value or '').partition('|')
+    try:
+        since = parse_datetime(moment)
+        kind, pk = map(int, position.split('|')) if position else (START, 0)
+    except ValueError:
+        return None
+    if since is None:
+        return None
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, timezone.utc)
+    return since, kind, pk
+
+
+def format_cursor(cursor):
+    """Курсор для ответа; позиция начала момента записывается просто временем"""
+    since, kind, pk = cursor
+    if kind == START:
+        return since.isoformat()
+    return f'{since.isoformat()}|{kind}|{pk}'
+
+
+def changes_since(cursor, limit=None, until=None):
+    """Возвращает (измененные книги, ID удаленных книг, курсор, есть ли еще)
+
+    Без limit отдаются все изменения до until одним ответом (выгрузка CSV).
+    """
+    until = until or timezone.now() - SAFETY_LAG
+    changed = _after(Book.objects.filter(updated_at__lt=until), 'updated_at', BOOK, cursor)
+    deleted = _after(BookTombstone.objects.filter(deleted_at__lt=until), 'deleted_at', TOMBSTONE, cursor)
+    # Курсор не сдвигается назад, если клиент пришел с моментом позже until
+    end = max(cursor, (until, START, 0))
+
+    if limit is None:
+        changed = changed.order_by('updated_at', 'pk')
+        return changed, deleted.values_list('book_id', flat=True), format_cursor(end), False
+
+    positions = sorted([
+        *((updated_at, BOOK, pk, pk) for updated_at, pk in changed.order_by(
+            'updated_at', 'pk'
+        ).values_list('updated_at', 'pk')[:limit + 1]),
+        *((deleted_at, TOMBSTONE, pk, book_id) for deleted_at, pk, book_id in deleted.order_by(
+            'deleted_at', 'pk'
+        ).values_list('deleted_at', 'pk', 'book_id')[:limit + 1]),
+    ])
+    has_more = len(positions) > limit
+    positions = positions[:limit]
+    if has_more:
+        end = positions[-1][:3]
+    book_ids = [position[3] for position in positions if position[1] == BOOK]
+    deleted_ids = [position[3] for position in positions if position[1] == TOMBSTONE]
+    changed = Book.objects.filter(pk__in=book_ids).order_by('updated_at', 'pk')
+    return changed, deleted_ids, format_cursor(end), has_more
+
+
+def _after(queryset, field, kind, cursor):
+    """Строки вида kind, стоящие в порядке ленты после позиции курсора"""
+    since, cursor_kind, cursor_pk = cursor
+    # Диапазон по индексу, совпадающие по времени строки отсекаются по (вид, pk)
+    queryset = queryset.filter(**{f'{field}__gte': since})
+    if kind < cursor_kind:
+        queryset = queryset.exclude(**{field: since})
+    elif kind == cursor_kind:
+        queryset = queryset.exclude(**{field: since, 'pk__lte': cursor_pk})
+    return queryset
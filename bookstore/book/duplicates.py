@@ -0,0 +1,230 @@
+"""Поиск и слияние дубликатов книг
+
+Дубликатами считаются книги с одинаковым нормализованным ISBN и книги
+с почти совпадающими названием и автором. Для второго случая сравнивать
+все пары книг слишком дорого, поэтому используется MinHash с LSH:
+для каждой книги считается сигнатура из NUM_PERM минимальных хешей
+трехсимвольных шинглов "название автор", сигнатура режется на BANDS
+полос, и сравниваются только книги, у которых совпала хотя бы одна
+полоса. Для кандидатов проверяется точный коэффициент Жаккара.
+"""
+import random
+import re
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+
+from django.db import transaction
+from django.utils import timezone
+
+from .isbn import normalize_isbn
+from .models import Book, BookReview, BookTextAnalysis, ReviewArchive
+from .sharding import shard_for_book
+from .stock import release
+
+SHINGLE_SIZE = 3
+NUM_PERM = 60
+BANDS = 12
+ROWS = NUM_PERM // BANDS
+
+# Порог сходства по умолчанию; вероятность попасть в кандидаты при
+# сходстве s равна 1 - (1 - s ** ROWS) ** BANDS: 0.99 при s = 0.8, 0.32 при s = 0.5
+DEFAULT_THRESHOLD = 0.8
+
+# Перестановки задаются XOR со случайными 64-битными масками: min(map(mask.__xor__, ...))
+# выполняется без байткода Python и в 2.5 раза быстрее, чем (a * x + b) mod p,
+# а доля найденных кандидатов при сходстве 0.7-0.9 на тех же данных такая же
+_rng = random.Random(20240601)
+MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERM)]
+
+re_non_word = re.compile(r'[\W_]+')
+
+
+def normalize_text(value):
+    return re_non_word.sub(' ', (value or '').lower().replace('ё', 'е')).strip()
+
+
+def hash64(value):
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def shingles(title, author):
+    """Множество 64-битных хешей трехсимвольных шинглов названия и автора"""
+    text = f'{normalize_text(title)} {normalize_text(author)}'
+    if len(text) <= SHINGLE_SIZE:
+        return {hash64(text)}
+    return {
+        hash64(text[start:start + SHINGLE_SIZE])
+        for start in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(hashes):
+    return tuple(min(map(mask.__xor__, hashes)) for mask in MASKS)
+
+
+def signatures(rows):
+    """Шинглы и сигнатуры пачки книг [(pk, title, author)] (выполняется в процессе пула)"""
+    result = []
+    for pk, title, author in rows:
+        hashes = shingles(title, author)
+        result.append((pk, hashes, minhash(hashes)))
+    return result
+
+
+def jaccard(first, second):
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
+
+class DisjointSet:
+    """Объединение книг в группы дубликатов"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            # Корень группы - книга с меньшим pk (добавлена раньше)
+            self.parent[max(first, second)] = min(first, second)
+
+    def groups(self):
+        groups = defaultdict(list)
+        for item in self.parent:
+            groups[self.find(item)].append(item)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+
+
+def find_duplicates(queryset=None, threshold=DEFAULT_THRESHOLD, workers=1, batch_size=2000):
+    """Группы дубликатов: список отсортированных списков pk
+
+    Первый pk группы - самая ранняя книга, в нее сливаются остальные.
+    Сигнатуры считаются в workers процессах пачками по batch_size книг.
+    """
+    if queryset is None:
+        queryset = Book.objects.all()
+    rows = queryset.order_by('pk').values_list('pk', 'title', 'author', 'isbn', 'isbn_normalized')
+
+    groups = DisjointSet()
+    by_isbn = {}
+    batches = []
+    for pk, title, author, isbn, isbn_normalized in rows.iterator(chunk_size=batch_size):
+        # У строк, оставшихся дубликатами после миграции, поле пустое
+        isbn_key = isbn_normalized or normalize_isbn(isbn)
+        if isbn_key:
+            if isbn_key in by_isbn:
+                groups.union(by_isbn[isbn_key], pk)
+            else:
+                by_isbn[isbn_key] = pk
+        if not batches or len(batches[-1]) == batch_size:
+            batches.append([])
+        batches[-1].append((pk, title, author))
+
+    book_shingles = {}
+    buckets = defaultdict(list)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(signatures, batches)
+    else:
+        executor = None
+        results = map(signatures, batches)
+    try:
+        for batch in results:
+            for pk, hashes, signature in batch:
+                book_shingles[pk] = hashes
+                for band in range(BANDS):
+                    buckets[band, signature[band * ROWS:(band + 1) * ROWS]].append(pk)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Одна и та же пара может совпасть в нескольких полосах
+    compared = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for index, first in enumerate(members):
+            for second in members[index + 1:]:
+                if (first, second) in compared or groups.find(first) == groups.find(second):
+                    continue
+                compared.add((first, second))
+                if jaccard(book_shingles[first], book_shingles[second]) >= threshold:
+                    groups.union(first, second)
+
+    return sorted(groups.groups())
+
+
+def merge_books(keeper_id, duplicate_ids):
+    """Переносит отзывы, архив отзывов и остаток дубликатов на книгу keeper_id и удаляет дубликаты
+
+    Результаты анализа дубликатов складываются с результатами книги
+    keeper_id, поэтому перенесенные отзывы сохраняют тональность и не
+    анализируются заново, а вклад архивных отзывов не теряется. Ключевые
+    слова пересчитает analyze_reviews (keywords_outdated).
+    Возвращает количество перенесенных отзывов.
+    """
+    from .bulk import delete_in_batches
+
+    duplicate_ids = [pk for pk in duplicate_ids if pk != keeper_id]
+    target = shard_for_book(keeper_id)
+    by_shard = defaultdict(list)
+    for pk in duplicate_ids:
+        by_shard[shard_for_book(pk)].append(pk)
+
+    moved = 0
+    for alias, book_ids in by_shard.items():
+        reviews = BookReview.objects.using(alias).filter(book_id__in=book_ids)
+        if alias == target:
+            moved += reviews.update(book_id=keeper_id)
+            continue
+        # Отзывы другого шарда копируются, исходные удалит delete_in_batches
+        copies = []
+        for review in reviews.order_by('pk').iterator(chunk_size=1000):
+            review.pk = None
+            review.book_id = keeper_id
+            copies.append(review)
+        with transaction.atomic(using=target):
+            BookReview.objects.using(target).bulk_create(copies, batch_size=1000)
+        moved += len(copies)
+
+    with transaction.atomic():
+        ReviewArchive.objects.filter(book_id__in=duplicate_ids).update(book_id=keeper_id)
+        _merge_analysis(keeper_id, duplicate_ids)
+
+    duplicates = Book.objects.filter(pk__in=duplicate_ids)
+    isbn = duplicates.exclude(isbn_normalized=None).order_by('pk').values_list('isbn', 'isbn_normalized').first()
+    stock = sum(book.available_stock for book in duplicates.only('stock', 'stock_shards'))
+    delete_in_batches(duplicates)
+    if stock:
+        release(keeper_id, stock)
+
+    # Новая дата обновления сбрасывает кэш строки каталога и попадает в ленту изменений
+    keeper = Book.objects.filter(pk=keeper_id)
+    keeper.update(updated_at=timezone.now())
+    if isbn is not None:
+        # ISBN удаленного дубликата достается книге, у которой его не было
+        keeper.filter(isbn_normalized=None).update(isbn=isbn[0], isbn_normalized=isbn[1])
+    return moved
+
+
+def _merge_analysis(keeper_id, duplicate_ids):
+    """Добавляет результаты анализа дубликатов к результатам книги keeper_id"""
+    analyses = list(BookTextAnalysis.objects.filter(book_id__in=duplicate_ids))
+    if not analyses:
+        return
+    keeper, _ = BookTextAnalysis.objects.select_for_update().get_or_create(book_id=keeper_id)
+    counts = Counter(keeper.term_counts)
+    for analysis in analyses:
+        counts.update(analysis.term_counts)
+        keeper.sentiment_sum += analysis.sentiment_sum
+        keeper.reviews_analyzed += analysis.reviews_analyzed
+    keeper.term_counts = dict(counts)
+    keeper.keywords_outdated = True
+    keeper.save()
@@ -0,0 +1,113 @@
+"""Экспорт каталога и лента изменений
+
+Вынесены из views.py: используются только партнерами для синхронизации,
+модуль загружается при первом обращении (см. urls.lazy_view).
+"""
+import csv
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.views import View
+
+from .changes import PAGE_SIZE, changes_since, parse_since
+from .models import Book
+
+
+class ExportBooksView(LoginRequiredMixin, View):
+    """Экспорт книг в CSV
+
+    С параметром ?since=<курсор> выгружаются только книги, созданные,
+    измененные или удаленные после курсора; новый курсор передается
+    в заголовке X-Changes-Cursor.
+    """
+
+    def get(self, request):
+        cursor = None
+        if 'since' in request.GET:
+            cursor = parse_since(request.GET['since'])
+            if cursor is None:
+                return HttpResponseBadRequest('Некорректный параметр since')
+
+        response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
+        response['Content-Disposition'] = 'attachment; filename="books_export.csv"'
+
+        header = [
+            'ID', 'Название', 'Автор', 'Жанр', 'Цена (₽)', 'Рейтинг',
+            'Год издания', 'Страниц', 'ISBN', 'В наличии', 'Дата добавления'
+        ]
+        writer = csv.writer(response)
+
+        if cursor is None:
+            writer.writerow(header)
+            for row in Book.objects.order_by('id').export_rows():
+                writer.writerow(self.book_row(row))
+            return response
+
+        since = cursor[0]
+        books, deleted_ids, next_cursor, _ = changes_since(cursor)
+        books = books.export_rows()
+        response['X-Changes-Cursor'] = next_cursor
+        writer.writerow(header + ['Статус'])
+        for book in books:
+            status = 'Создана' if book.created_at >= since else 'Изменена'
+            writer.writerow(self.book_row(book) + [status])
+        for book_id in deleted_ids:
+            writer.writerow([book_id] + [''] * (len(header) - 1) + ['Удалена'])
+
+        return response
+
+    def book_row(self, book):
+        """Поля строки CSV; book - Book или ExportRow"""
+        return [
+            book.id,
+            book.title,
+            book.author,
+            book.get_genre_display(),
+            book.price_rub,
+            book.rating or '',
+            book.publication_year or '',
+            book.page_count or '',
+            book.isbn or '',
+            'Да' if book.is_available else 'Нет',
+            book.created_at.strftime('%d.%m.%Y %H:%M')
+        ]
+
+
+class ChangeFeedView(LoginRequiredMixin, View):
+    """Лента изменений каталога в JSON: ?since=<курсор из предыдущего ответа>
+
+    Отдается по PAGE_SIZE изменений; при has_more клиент сразу запрашивает
+    следующую страницу с новым курсором.
+    """
+
+    def get(self, request):
+        cursor = parse_since(request.GET.get('since'))
+        if cursor is None:
+            return HttpResponseBadRequest('Укажите параметр since в формате ISO 8601')
+
+        since = cursor[0]
+        books, deleted_ids, next_cursor, has_more = changes_since(cursor, limit=PAGE_SIZE)
+        books = books.export_rows()
+        changed = [
+            {
+                'id': book.id,
+                'title': book.title,
+                'author': book.author,
+                'genre': book.genre,
+                'price_rub': str(book.price_rub),
+                'rating': str(book.rating) if book.rating is not None else None,
+                'publication_year': book.publication_year,
+                'page_count': book.page_count,
+                'isbn': book.isbn,
+                'is_available': book.is_available,
+                'created': book.created_at >= since,
+                'updated_at': book.updated_at.isoformat(),
+            }
+            for book in books
+        ]
+        return JsonResponse({
+            'cursor': next_cursor,
+            'has_more': has_more,
+            'changed': changed,
+            'deleted': list(deleted_ids),
+        })
@@ -1,15 +1,89 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from .models import Book, BookReview
 
 
-class BookForm(forms.ModelForm):
+class StockFormMixin:
+    """Правка остатка в форме книги как изменение, а не новое значение
+
+    Пока форма открыта, покупки уменьшают остаток (book.stock), поэтому
+    вместе с полем отправляется показанное пользователю значение
+    (show_hidden_initial). Существующая книга сохраняется без полей
+    остатка (Book.STOCK_FIELDS), а разница применяется атомарно
+    (book.stock.adjust_stock). Админка сохраняет форму с commit=False и
+    вызывает save_book() сама.
+    У книг с несколькими счетчиками остаток в форме не редактируется.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Значения из БД: при проверке формы их заменят введенные
+        self.stored_stock = (self.instance.stock, self.instance.is_available)
+        field = self.fields.get('stock')
+        if field is None:
+            return
+        if self.instance.pk is not None and self.instance.stock_shards:
+            field.disabled = True
+            field.help_text = 'Остаток разделен на счетчики и меняется покупками и поставками'
+        else:
+            field.show_hidden_initial = True
+
+    def stock_delta(self):
+        """Изменение остатка, сделанное пользователем в форме"""
+        field = self.fields.get('stock')
+        if field is None or not field.show_hidden_initial or self.instance._state.adding:
+            return 0
+        shown = field.hidden_widget().value_from_datadict(
+            self.data, self.files, self['stock'].html_initial_name
+        )
+        try:
+            shown = field.to_python(shown)
+        except ValidationError:
+            shown = None
+        if shown is None:
+            shown = self.stored_stock[0]
+        return self.cleaned_data['stock'] - shown
+
+    def save_book(self):
+        """Сохраняет книгу; остаток существующей меняется только на разницу из формы"""
+        book = self.instance
+        if book._state.adding:
+            book.save()
+            return book
+        delta = self.stock_delta()
+        book.stock, book.is_available = self.stored_stock
+        book.save(update_fields=[
+            field.name for field in book._meta.concrete_fields
+            if not field.primary_key and field.name not in Book.STOCK_FIELDS
+        ])
+        if delta:
+            # book.stock тянет за собой bulk и history, форма импортируется админкой при запуске
+            from .stock import adjust_stock
+
+            adjust_stock(book.pk, delta)
+            book.stock, book.is_available = Book.objects.filter(pk=book.pk).values_list(
+                'stock', 'is_available'
+            ).get()
+            # Смену наличия adjust_stock уже записал в историю
+            book._loaded_history_values = book.history_values()
+        return book
+
+    def save(self, commit=True):
+        book = super().save(commit=False)
+        if commit:
+            self.save_book()
+            self._save_m2m()
+        return book
+
+
+class BookForm(StockFormMixin, forms.ModelForm):
     class Meta:
         model = Book
         fields = [
             'title', 'author', 'genre', 'short_description',
             'reading_reason', 'rating', 'price_rub', 'isbn',
             'publication_year', 'page_count', 'cover_image',
-            'is_available'
+            'stock'
         ]
         widgets = {
             'short_description': forms.Textarea(attrs={'rows': 3}),
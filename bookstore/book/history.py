@@ -0,0 +1,144 @@
+"""Запись истории цен и инкрементальное обновление дневных сводок
+
+Каждое изменение цены или наличия добавляет строку в BookPriceHistory и
+сразу учитывается в GenrePriceDaily (min/max/сумма/количество за день по
+жанру), поэтому графики на странице статистики не читают сырую историю.
+
+Средняя цена изменившихся за день книг у разных дней считается по разным
+наборам книг, поэтому динамика цен строится по сумме переоценок
+(price_delta): разнице новой и прежней цены каждой книги.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import Book, BookPriceHistory, GenrePriceDaily
+
+
+def record_changes(rows, changed_at=None):
+    """Записывает изменения; rows - итерируемое (book_id, genre, price_rub, is_available)"""
+    changed_at = changed_at or timezone.now()
+    day = timezone.localdate(changed_at)
+    month = day.replace(day=1)
+
+    entries = [
+        BookPriceHistory(
+            book_id=book_id,
+            genre=genre,
+            price_rub=price_rub,
+            is_available=is_available,
+            month=month,
+            changed_at=changed_at
+        )
+        for book_id, genre, price_rub, is_available in rows
+    ]
+    if not entries:
+        return 0
+
+    with transaction.atomic():
+        # Сначала запись: в SQLite транзакция, начатая с чтения, при
+        # параллельной записи не ждет блокировку, а сразу получает ошибку
+        BookPriceHistory.objects.bulk_create(entries)
+        previous = _previous_prices(
+            [entry.book_id for entry in entries], exclude=[entry.pk for entry in entries]
+        )
+
+        groups = defaultdict(list)
+        deltas = defaultdict(list)
+        for entry in entries:
+            groups[entry.genre].append(entry.price_rub)
+            # Переход в другой жанр и первая запись книги - не переоценка
+            old = previous.get(entry.book_id)
+            if old is not None and old[0] == entry.genre and old[1] != entry.price_rub:
+                deltas[entry.genre].append(entry.price_rub - old[1])
+        for genre, prices in groups.items():
+            _add_to_daily(genre, day, prices, deltas[genre])
+
+    return len(entries)
+
+
+def _previous_prices(book_ids, exclude=()):
+    """Последние записи истории книг без записей exclude: {book_id: (genre, price_rub)}"""
+    latest = BookPriceHistory.objects.filter(
+        book_id=OuterRef('book_id')
+    ).exclude(pk__in=exclude).order_by('-changed_at', '-pk').values('pk')[:1]
+    rows = BookPriceHistory.objects.filter(
+        book_id__in=book_ids, pk=Subquery(latest)
+    ).values_list('book_id', 'genre', 'price_rub')
+    return {book_id: (genre, price_rub) for book_id, genre, price_rub in rows}
+
+
+def _add_to_daily(genre, day, prices, deltas=()):
+    """Добавляет цены в сводку за день одним UPDATE (или INSERT для нового дня)"""
+    low, high, total = min(prices), max(prices), sum(prices)
+    delta = sum(deltas)
+    rollup = GenrePriceDaily.objects.filter(genre=genre, day=day)
+    values = {
+        'min_price': Least(F('min_price'), low),
+        'max_price': Greatest(F('max_price'), high),
+        'price_sum': F('price_sum') + total,
+        'samples': F('samples') + len(prices),
+        'price_delta': F('price_delta') + delta,
+        'repriced': F('repriced') + len(deltas),
+    }
+    if rollup.update(**values):
+        return
+    try:
+        with transaction.atomic():
+            GenrePriceDaily.objects.create(
+                genre=genre, day=day,
+                min_price=low, max_price=high,
+                price_sum=total, samples=len(prices),
+                price_delta=delta, repriced=len(deltas)
+            )
+    except IntegrityError:
+        # Строку за этот день успел создать параллельный запрос
+        rollup.update(**values)
+
+
+def record_book(book):
+    """Запись истории для одного сохраненного экземпляра Book"""
+    record_changes([(book.pk, book.genre, book.price_rub, book.is_available)])
+    book._loaded_history_values = book.history_values()
+
+
+def price_trends(days=30):
+    """Динамика цен по жанрам за последние days дней по дневным сводкам
+
+    Изменение - сумма переоценок книг жанра за период к уровню цен жанра
+    на начало периода (текущая сумма цен книг жанра минус эти переоценки).
+    Мин. и макс. - крайние цены, установленные за период; средняя цена -
+    текущая по каталогу.
+    """
+    since = timezone.localdate() - timedelta(days=days)
+    genre_names = dict(GenrePriceDaily._meta.get_field('genre').choices)
+
+    trends = {}
+    for rollup in GenrePriceDaily.objects.filter(day__gte=since).order_by('genre', 'day'):
+        trend = trends.setdefault(rollup.genre, {
+            'name': genre_names.get(rollup.genre, rollup.genre),
+            'min_price': rollup.min_price,
+            'max_price': rollup.max_price,
+            'price_delta': 0,
+            'repriced': 0,
+        })
+        trend['min_price'] = min(trend['min_price'], rollup.min_price)
+        trend['max_price'] = max(trend['max_price'], rollup.max_price)
+        trend['price_delta'] += rollup.price_delta
+        trend['repriced'] += rollup.repriced
+
+    levels = Book.objects.filter(genre__in=trends).order_by().values('genre').annotate(
+        price_sum=Sum('price_rub'), books=Count('pk')
+    )
+    levels = {level['genre']: level for level in levels}
+    for genre, trend in trends.items():
+        level = levels.get(genre)
+        trend['avg_price'] = level['price_sum'] / level['books'] if level else None
+        start = level['price_sum'] - trend['price_delta'] if level else 0
+        trend['change'] = trend['price_delta'] / start * 100 if start else 0
+
+    return sorted(trends.values(), key=lambda trend: trend['name'])
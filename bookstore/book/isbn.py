@@ -0,0 +1,37 @@
+"""Приведение ISBN к единому виду
+
+ISBN-10 и ISBN-13 одного издания, записанные с дефисами, пробелами или
+без них, приводятся к 13 цифрам без разделителей. По этому значению
+построен уникальный индекс (Book.isbn_normalized).
+"""
+import re
+
+re_separators = re.compile(r'[\s\-]')
+re_isbn10 = re.compile(r'\d{9}[\dX]')
+re_isbn13 = re.compile(r'97[89]\d{10}')
+
+
+def isbn10_check_digit(digits):
+    total = sum((10 - position) * int(digit) for position, digit in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    """ISBN-13 без разделителей или None, если значение не является ISBN"""
+    if not value:
+        return None
+    value = re_separators.sub('', value).upper()
+    if re_isbn10.fullmatch(value):
+        if isbn10_check_digit(value) != value[9]:
+            return None
+        value = '978' + value[:9]
+        return value + isbn13_check_digit(value)
+    if re_isbn13.fullmatch(value) and isbn13_check_digit(value) == value[12]:
+        return value
+    return None
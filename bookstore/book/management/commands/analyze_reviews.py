@@ -0,0 +1,121 @@
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from book.analysis import analyze_batch, forget_reviews, top_keywords
+from book.models import BookReview, BookTextAnalysis
+from book.sharding import review_databases
+
+
+class Command(BaseCommand):
+    help = 'Анализ новых отзывов: тональность и ключевые слова книг (TF-IDF)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Количество отзывов в одной задаче для процесса'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Количество процессов'
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать ключевые слова всех книг, а не только затронутых'
+        )
+
+    def handle(self, *args, **options):
+        analyzed = 0
+        book_terms = defaultdict(Counter)
+        book_sentiments = defaultdict(list)
+
+        for alias in review_databases():
+            self.forget_unapproved(alias, options['batch_size'])
+
+        # Пачки текстов обрабатываются параллельно, запись в БД - в основном процессе
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for alias in review_databases():
+                sentiments = []
+                batches = self.pending_batches(alias, options['batch_size'])
+                for results in executor.map(analyze_batch, batches):
+                    for review_id, book_id, score, terms in results:
+                        sentiments.append(BookReview(pk=review_id, sentiment=score))
+                        book_terms[book_id].update(terms)
+                        book_sentiments[book_id].append(score)
+                BookReview.objects.using(alias).bulk_update(sentiments, ['sentiment'], batch_size=1000)
+                analyzed += len(sentiments)
+
+        with transaction.atomic():
+            self.merge_analysis(book_terms, book_sentiments)
+            updated_keywords = self.update_keywords(None if options['full'] else book_terms.keys())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Проанализировано отзывов: {analyzed}, '
+            f'обновлены ключевые слова у {updated_keywords} книг'
+        ))
+
+    def forget_unapproved(self, alias, batch_size):
+        """Снимает вклад отзывов, проанализированных до снятия одобрения
+
+        Такие отзывы оставались после прежних версий команды, которые
+        анализировали и неодобренные отзывы.
+        """
+        while True:
+            rows = list(
+                BookReview.objects.using(alias).filter(
+                    is_approved=False, sentiment__isnull=False
+                ).values_list('pk', 'book_id', 'text', 'sentiment')[:batch_size]
+            )
+            if not rows:
+                return
+            with transaction.atomic():
+                forget_reviews([(book_id, text, score) for _, book_id, text, score in rows])
+                BookReview.objects.using(alias).filter(pk__in=[row[0] for row in rows]).update(sentiment=None)
+
+    def pending_batches(self, alias, batch_size):
+        """Пачки еще не проанализированных одобренных отзывов базы alias: [(id, book_id, text)]"""
+        pending = BookReview.objects.using(alias).filter(
+            is_approved=True, sentiment__isnull=True
+        ).order_by('pk').values_list('pk', 'book_id', 'text')
+        batch = []
+        for row in pending.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def merge_analysis(self, book_terms, book_sentiments):
+        """Добавляет результаты новых отзывов к накопленным по книгам"""
+        existing = BookTextAnalysis.objects.in_bulk(list(book_terms), field_name='book_id')
+        for book_id, terms in book_terms.items():
+            analysis = existing.get(book_id) or BookTextAnalysis(book_id=book_id)
+            counts = Counter(analysis.term_counts)
+            counts.update(terms)
+            analysis.term_counts = dict(counts)
+            analysis.sentiment_sum += sum(book_sentiments[book_id])
+            analysis.reviews_analyzed += len(book_sentiments[book_id])
+            analysis.save()
+
+    def update_keywords(self, book_ids):
+        """Пересчитывает TF-IDF для книг book_ids и книг с устаревшими словами (None - для всех)"""
+        document_frequency = Counter()
+        documents = 0
+        for term_counts in BookTextAnalysis.objects.values_list('term_counts', flat=True).iterator():
+            document_frequency.update(term_counts.keys())
+            documents += 1
+
+        targets = BookTextAnalysis.objects.all()
+        if book_ids is not None:
+            targets = targets.filter(Q(book_id__in=book_ids) | Q(keywords_outdated=True))
+        targets = list(targets)
+        for analysis in targets:
+            analysis.keywords = top_keywords(analysis.term_counts, document_frequency, documents)
+            analysis.keywords_outdated = False
+        BookTextAnalysis.objects.bulk_update(targets, ['keywords', 'keywords_outdated'], batch_size=500)
+        return len(targets)
@@ -0,0 +1,52 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from book.archive import BATCH_SIZE, archive_books, archive_reviews
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые отзывы и давно отсутствующие в продаже книги в сжатый архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reviews-days', type=int, default=settings.ARCHIVE_REVIEWS_AFTER_DAYS,
+            help='Архивировать одобренные отзывы старше стольких дней (0 - не архивировать)'
+        )
+        parser.add_argument(
+            '--books-days', type=int, default=settings.ARCHIVE_BOOKS_AFTER_DAYS,
+            help='Архивировать книги не в продаже, не менявшиеся столько дней (0 - не архивировать)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество строк в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        started = time.perf_counter()
+        if options['reviews_days']:
+            stats = archive_reviews(
+                now - timedelta(days=options['reviews_days']), options['batch_size'], self._progress
+            )
+            self._report(f'Отзывов перенесено: {stats["reviews"]}', stats)
+        if options['books_days']:
+            stats = archive_books(
+                now - timedelta(days=options['books_days']), options['batch_size'], self._progress
+            )
+            self._report(f'Книг перенесено: {stats["books"]} (с отзывами: {stats["book_reviews"]})', stats)
+        self.stdout.write(f'Время: {time.perf_counter() - started:.1f} с')
+
+    def _progress(self, kind, total):
+        self.stdout.write(f'  {kind}: {total}')
+
+    def _report(self, message, stats):
+        if stats['raw_bytes']:
+            message += (
+                f'; {stats["raw_bytes"] / 1024:.0f} КБ JSON -> {stats["archive_bytes"] / 1024:.0f} КБ '
+                f'(сжатие в {stats["raw_bytes"] / stats["archive_bytes"]:.1f} раза)'
+            )
+        self.stdout.write(self.style.SUCCESS(message))
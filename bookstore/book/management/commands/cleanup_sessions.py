@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+DB_BACKENDS = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие сессии из БД пачками, не блокируя таблицу надолго'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество сессий, удаляемых одним запросом'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help='Пауза между пачками в секундах'
+        )
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE not in DB_BACKENDS:
+            self.stdout.write('Сессии хранятся не в БД, очистка не требуется')
+            return
+
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now).order_by('expire_date')
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            self.stdout.write(f'Удалено сессий: {deleted}')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, удалено истекших сессий: {deleted}'))
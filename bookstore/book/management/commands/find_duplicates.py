@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from book.duplicates import DEFAULT_THRESHOLD, find_duplicates, merge_books
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Поиск дубликатов книг по ISBN и по сходству названия и автора (MinHash/LSH)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float, default=DEFAULT_THRESHOLD,
+            help='Минимальный коэффициент Жаккара шинглов "название автор"'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Количество процессов для расчета сигнатур MinHash'
+        )
+        parser.add_argument(
+            '--merge', action='store_true',
+            help='Слить каждую группу в самую раннюю книгу (отзывы переносятся, дубликаты удаляются)'
+        )
+
+    def handle(self, *args, **options):
+        groups = find_duplicates(threshold=options['threshold'], workers=options['workers'])
+        titles = Book.objects.in_bulk([pk for group in groups for pk in group])
+
+        moved = 0
+        for keeper_id, *duplicate_ids in groups:
+            self.stdout.write(f'{keeper_id}: {titles[keeper_id]}')
+            for pk in duplicate_ids:
+                self.stdout.write(f'  {pk}: {titles[pk]}')
+            if options['merge']:
+                moved += merge_books(keeper_id, duplicate_ids)
+
+        duplicates = sum(len(group) - 1 for group in groups)
+        if options['merge']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Групп: {len(groups)}, удалено дубликатов: {duplicates}, перенесено отзывов: {moved}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Групп: {len(groups)}, дубликатов: {duplicates}'))
@@ -0,0 +1,65 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from book.changes import SAFETY_LAG
+from book.prerender import all_pages, changed_pages, init_worker, load_manifest, render_pages, save_manifest
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет статические копии страниц книг, жанров, авторов и каталога (только измененные)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Перерисовать все страницы, а не только затронутые изменениями'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Количество процессов'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Количество страниц в одной задаче для процесса'
+        )
+
+    def handle(self, *args, **options):
+        root = str(settings.PRERENDER_ROOT)
+        # Изменения, сделанные во время генерации, попадут в следующий запуск;
+        # запас SAFETY_LAG - на транзакции с датой изменения до их фиксации
+        started_at = timezone.now() - SAFETY_LAG
+        manifest = None if options['full'] else load_manifest(root)
+
+        if manifest is None:
+            urls, books = all_pages()
+        else:
+            books = manifest['books']
+            urls = changed_pages(manifest['since'], books)
+
+        started = time.perf_counter()
+        batch_size = options['batch_size']
+        batches = [urls[start:start + batch_size] for start in range(0, len(urls), batch_size)]
+        statuses = Counter()
+
+        # Процессы не должны унаследовать открытые соединения с БД
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as executor:
+            futures = [executor.submit(render_pages, root, settings.PRERENDER_HOST, batch) for batch in batches]
+            for future in futures:
+                for url, status in future.result():
+                    statuses[status] += 1
+                    if status == 'skipped':
+                        self.stderr.write(f'Страница не сохранена: {url}')
+
+        save_manifest(root, started_at, books)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Полная генерация" if manifest is None else "Обновление"}: '
+            f'сохранено {statuses["rendered"]}, удалено {statuses["removed"]}, '
+            f'пропущено {statuses["skipped"]} страниц за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,123 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Скрипт выполняется в чистом интерпретаторе и печатает длительность фаз в JSON
+PHASES_SCRIPT = '''
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookstore.settings')
+phases = []
+started = last = time.perf_counter()
+
+def mark(name):
+    global last
+    now = time.perf_counter()
+    phases.append((name, now - last))
+    last = now
+
+import django
+mark('import django')
+from django.conf import settings
+settings.INSTALLED_APPS
+mark('settings')
+django.setup(set_prefix=False)
+mark('apps.populate (models, admin, signals)')
+if sys.argv[1] == 'wsgi':
+    from django.core.wsgi import get_wsgi_application
+    get_wsgi_application()
+    mark('WSGI handler + middleware')
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    mark('URLconf')
+phases.append(('total', time.perf_counter() - started))
+print(json.dumps(phases))
+'''
+
+IMPORTTIME_SCRIPT = '''
+import os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookstore.settings')
+import django
+django.setup()
+if sys.argv[1] == 'wsgi':
+    from django.core.wsgi import get_wsgi_application
+    get_wsgi_application()
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+'''
+
+
+class Command(BaseCommand):
+    help = 'Профиль запуска: фазы инициализации Django и время импорта модулей (-X importtime)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', choices=['manage', 'wsgi'], default='wsgi',
+            help='manage - только django.setup(), wsgi - загрузка воркера целиком'
+        )
+        parser.add_argument(
+            '--top', type=int, default=25,
+            help='Сколько самых "дорогих" модулей показать'
+        )
+        parser.add_argument(
+            '--runs', type=int, default=3,
+            help='Количество запусков для усреднения фаз'
+        )
+        parser.add_argument(
+            '--prefix', default='',
+            help='Показывать только модули с этим префиксом (например, book)'
+        )
+
+    def handle(self, *args, **options):
+        target = options['target']
+
+        runs = [self.run_phases(target) for _ in range(options['runs'])]
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Фазы запуска ({target}), среднее по {len(runs)}:'))
+        for index, (name, _) in enumerate(runs[0]):
+            average = sum(run[index][1] for run in runs) / len(runs)
+            self.stdout.write(f'  {name:<45} {average * 1000:8.1f} мс')
+
+        modules = self.run_importtime(target)
+        if options['prefix']:
+            modules = [module for module in modules if module[0].startswith(options['prefix'])]
+        total_self = sum(module[1] for module in modules)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Импорт модулей: {len(modules)} шт., собственное время {total_self / 1000:.1f} мс'
+        ))
+        self.stdout.write(f'  {"модуль":<50} {"свое, мс":>10} {"всего, мс":>10}')
+        for name, self_us, cumulative_us in sorted(modules, key=lambda m: -m[2])[:options['top']]:
+            self.stdout.write(f'  {name:<50} {self_us / 1000:10.1f} {cumulative_us / 1000:10.1f}')
+
+    def run_phases(self, target):
+        output = self.run_python(['-c', PHASES_SCRIPT, target])
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def run_importtime(self, target):
+        # -X importtime не видит модули, загруженные через importlib.import_module
+        # (settings, models и admin приложений) - их время входит в фазы выше
+        output = self.run_python(['-X', 'importtime', '-c', IMPORTTIME_SCRIPT, target])
+        return parse_importtime(output.stderr)
+
+    def run_python(self, arguments):
+        result = subprocess.run(
+            [sys.executable] + arguments,
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr)
+        return result
+
+
+def parse_importtime(stderr):
+    """Разбирает вывод -X importtime в [(модуль, свое мкс, всего мкс)]"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
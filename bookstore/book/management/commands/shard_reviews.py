@@ -0,0 +1,50 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from book.models import BookReview
+from book.sharding import review_databases, shard_count, shard_for_book
+
+
+class Command(BaseCommand):
+    help = 'Создает базы шардов отзывов и переносит в них отзывы из основной базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество отзывов, переносимых за одну транзакцию'
+        )
+
+    def handle(self, *args, **options):
+        if not shard_count():
+            raise CommandError('Шардирование выключено: задайте BOOKSTORE_REVIEW_SHARDS')
+
+        for alias in review_databases():
+            call_command('migrate', 'book', database=alias, verbosity=0)
+            self.stdout.write(f'Схема базы {alias} обновлена')
+
+        moved = 0
+        batch_size = options['batch_size']
+        while True:
+            batch = list(BookReview.objects.using('default').order_by('pk')[:batch_size])
+            if not batch:
+                break
+
+            by_shard = {}
+            for review in batch:
+                by_shard.setdefault(shard_for_book(review.book_id), []).append(review)
+
+            # Сначала запись в шарды, затем удаление из основной базы: при сбое
+            # отзывы окажутся в обоих местах, повторный запуск их не задублирует
+            for alias, reviews in by_shard.items():
+                with transaction.atomic(using=alias):
+                    ids = [review.pk for review in reviews]
+                    BookReview.objects.using(alias).filter(pk__in=ids).delete()
+                    BookReview.objects.using(alias).bulk_create(reviews)
+            with transaction.atomic(using='default'):
+                BookReview.objects.using('default').filter(pk__in=[r.pk for r in batch])._raw_delete('default')
+
+            moved += len(batch)
+            self.stdout.write(f'Перенесено отзывов: {moved}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, перенесено отзывов: {moved}'))
@@ -0,0 +1,103 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+# Перевод строки и отступ следующей строки; в HTML это эквивалентно одному переводу строки
+re_indent = re.compile(rb'\n\s+')
+re_preformatted = re.compile(rb'<(pre|textarea)\b', re.IGNORECASE)
+re_accepts_gzip = re.compile(r'\bgzip\b')
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class ResponseOptimizationMiddleware(MiddlewareMixin):
+    """Сжатие ответов (brotli или gzip) и удаление отступов из HTML
+
+    Страницы с CSRF-токеном не сжимаются: сжатие вместе с отраженным
+    пользовательским вводом позволяет подобрать токен (атака BREACH).
+    """
+
+    # Короткие ответы сжимать невыгодно
+    min_length = 200
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+
+        if not response.streaming and response.get('Content-Type', '').startswith('text/html'):
+            self.strip_whitespace(response)
+
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if self.uses_csrf_token(request, response):
+            return response
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and re_accepts_brotli.search(accept_encoding):
+            encoding = 'br'
+        elif re_accepts_gzip.search(accept_encoding):
+            encoding = 'gzip'
+        else:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            if encoding == 'br':
+                response.streaming_content = brotli_sequence(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=5)
+            else:
+                compressed = compress_string(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Сжатый ответ не совпадает с исходным побайтно, поэтому ETag становится слабым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def uses_csrf_token(self, request, response):
+        # CsrfViewMiddleware сбрасывает CSRF_COOKIE_NEEDS_UPDATE после установки
+        # cookie, поэтому признак использования токена - cookie в ответе
+        return (
+            request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            or settings.CSRF_COOKIE_NAME in response.cookies
+        )
+
+    def strip_whitespace(self, response):
+        content = response.content
+        if re_preformatted.search(content):
+            return
+        stripped = re_indent.sub(b'\n', content)
+        if len(stripped) < len(content):
+            response.content = stripped
+            if response.has_header('Content-Length'):
+                response.headers['Content-Length'] = str(len(stripped))
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=5)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0004_book_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingReview',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Отзыв на модерации',
+                'verbose_name_plural': 'Очередь модерации',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('book.bookreview',),
+        ),
+        migrations.AddIndex(
+            model_name='bookreview',
+            index=models.Index(fields=['book', 'is_approved', '-created_at'], name='review_book_approved_idx'),
+        ),
+    ]
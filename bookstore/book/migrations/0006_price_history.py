@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-19 08:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0005_review_moderation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(choices=[('FICTION', 'Художественная литература'), ('SCIFI', 'Научная фантастика'), ('FANTASY', 'Фэнтези'), ('CLASSIC', 'Классика'), ('DETECTIVE', 'Детектив'), ('ROMANCE', 'Роман'), ('HISTORY', 'Историческая'), ('PSYCHOLOGY', 'Психология'), ('PHILOSOPHY', 'Философия'), ('CHILDREN', 'Детская'), ('OTHER', 'Другое')], max_length=50, verbose_name='Жанр')),
+                ('price_rub', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена (₽)')),
+                ('is_available', models.BooleanField(verbose_name='В наличии')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение цены',
+                'verbose_name_plural': 'История цен',
+                'ordering': ['-changed_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GenrePriceDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(choices=[('FICTION', 'Художественная литература'), ('SCIFI', 'Научная фантастика'), ('FANTASY', 'Фэнтези'), ('CLASSIC', 'Классика'), ('DETECTIVE', 'Детектив'), ('ROMANCE', 'Роман'), ('HISTORY', 'Историческая'), ('PSYCHOLOGY', 'Психология'), ('PHILOSOPHY', 'Философия'), ('CHILDREN', 'Детская'), ('OTHER', 'Другое')], max_length=50, verbose_name='Жанр')),
+                ('day', models.DateField(verbose_name='День')),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Мин. цена')),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Макс. цена')),
+                ('price_sum', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Сумма цен')),
+                ('samples', models.PositiveIntegerField(verbose_name='Количество изменений')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка цен',
+                'verbose_name_plural': 'Дневные сводки цен',
+                'ordering': ['genre', 'day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='genrepricedaily',
+            constraint=models.UniqueConstraint(fields=('genre', 'day'), name='genre_price_daily_unique'),
+        ),
+        migrations.AddField(
+            model_name='bookpricehistory',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='book.book', verbose_name='Книга'),
+        ),
+        migrations.AddIndex(
+            model_name='bookpricehistory',
+            index=models.Index(fields=['month', 'book'], name='price_history_month_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookpricehistory',
+            index=models.Index(fields=['book', '-changed_at'], name='price_history_book_idx'),
+        ),
+    ]
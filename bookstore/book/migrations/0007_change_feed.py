@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-19 08:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0006_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField(verbose_name='ID книги')),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удаленная книга',
+                'verbose_name_plural': 'Удаленные книги',
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+        ),
+    ]
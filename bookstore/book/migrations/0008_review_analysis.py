@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 08:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0007_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookreview',
+            name='sentiment',
+            field=models.FloatField(blank=True, editable=False, help_text='От -1 (негативный) до 1 (позитивный), заполняется командой analyze_reviews', null=True, verbose_name='Тональность'),
+        ),
+        migrations.CreateModel(
+            name='BookTextAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term_counts', models.JSONField(default=dict, verbose_name='Частоты слов')),
+                ('keywords', models.JSONField(default=list, verbose_name='Ключевые слова')),
+                ('sentiment_sum', models.FloatField(default=0, verbose_name='Сумма тональностей')),
+                ('reviews_analyzed', models.PositiveIntegerField(default=0, verbose_name='Проанализировано отзывов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='book.book', verbose_name='Книга')),
+            ],
+            options={
+                'verbose_name': 'Анализ отзывов',
+                'verbose_name_plural': 'Анализ отзывов',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-19 08:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0008_review_analysis'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookreview',
+            name='book',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='book.book', verbose_name='Книга'),
+        ),
+    ]
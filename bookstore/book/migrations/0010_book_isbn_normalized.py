@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-19 08:52
+
+from django.db import migrations, models
+
+
+def fill_isbn_normalized(apps, schema_editor):
+    """Заполняет нормализованный ISBN; у повторов значение остается пустым"""
+    from book.isbn import normalize_isbn
+
+    Book = apps.get_model('book', 'Book')
+    seen = set()
+    changed = []
+    books = Book.objects.filter(isbn__isnull=False).exclude(isbn='').order_by('pk').only('pk', 'isbn')
+    for book in books.iterator(chunk_size=2000):
+        normalized = normalize_isbn(book.isbn)
+        if normalized is None or normalized in seen:
+            continue
+        seen.add(normalized)
+        book.isbn_normalized = normalized
+        changed.append(book)
+    Book.objects.bulk_update(changed, ['isbn_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0009_review_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn_normalized',
+            field=models.CharField(editable=False, max_length=13, null=True, verbose_name='ISBN (нормализованный)'),
+        ),
+        migrations.RunPython(fill_isbn_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='book',
+            name='isbn_normalized',
+            field=models.CharField(editable=False, max_length=13, null=True, unique=True, verbose_name='ISBN (нормализованный)'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-19 08:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stock(apps, schema_editor):
+    """Книги "в наличии" без указанного количества получают один экземпляр"""
+    Book = apps.get_model('book', 'Book')
+    Book.objects.filter(is_available=True).update(stock=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0010_book_isbn_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='stock',
+            field=models.PositiveIntegerField(default=0, verbose_name='Остаток на складе'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='0 - остаток хранится в поле stock', verbose_name='Счетчиков остатка'),
+        ),
+        migrations.RunPython(fill_stock, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='book',
+            name='is_available',
+            field=models.BooleanField(default=False, editable=False, verbose_name='В наличии'),
+        ),
+        migrations.CreateModel(
+            name='BookStockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField(verbose_name='Номер счетчика')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_counters', to='book.book', verbose_name='Книга')),
+            ],
+            options={
+                'verbose_name': 'Счетчик остатка',
+                'verbose_name_plural': 'Счетчики остатка',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookstockshard',
+            constraint=models.UniqueConstraint(fields=('book', 'number'), name='unique_book_stock_shard'),
+        ),
+    ]
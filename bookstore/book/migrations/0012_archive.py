@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-19 09:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0011_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField(unique=True, verbose_name='ID книги')),
+                ('title', models.CharField(db_index=True, max_length=255, verbose_name='Название')),
+                ('author', models.CharField(max_length=255, verbose_name='Автор')),
+                ('genre', models.CharField(choices=[('FICTION', 'Художественная литература'), ('SCIFI', 'Научная фантастика'), ('FANTASY', 'Фэнтези'), ('CLASSIC', 'Классика'), ('DETECTIVE', 'Детектив'), ('ROMANCE', 'Роман'), ('HISTORY', 'Историческая'), ('PSYCHOLOGY', 'Психология'), ('PHILOSOPHY', 'Философия'), ('CHILDREN', 'Детская'), ('OTHER', 'Другое')], max_length=50, verbose_name='Жанр')),
+                ('sentiment_sum', models.FloatField(default=0, verbose_name='Сумма тональностей')),
+                ('reviews_analyzed', models.PositiveIntegerField(default=0, verbose_name='Проанализировано отзывов')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата архивации')),
+                ('data', models.BinaryField(verbose_name='Данные (JSON, zlib)')),
+            ],
+            options={
+                'verbose_name': 'Книга в архиве',
+                'verbose_name_plural': 'Архив книг',
+                'ordering': ['-archived_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField(db_index=True, verbose_name='ID книги')),
+                ('reviews_count', models.PositiveIntegerField(verbose_name='Отзывов')),
+                ('approved_count', models.PositiveIntegerField(verbose_name='Одобренных отзывов')),
+                ('rating_sum', models.PositiveIntegerField(verbose_name='Сумма оценок одобренных отзывов')),
+                ('oldest_at', models.DateTimeField(verbose_name='Самый ранний отзыв')),
+                ('newest_at', models.DateTimeField(verbose_name='Самый поздний отзыв')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата архивации')),
+                ('data', models.BinaryField(verbose_name='Отзывы (JSON, zlib)')),
+            ],
+            options={
+                'verbose_name': 'Архив отзывов',
+                'verbose_name_plural': 'Архив отзывов',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+# Индексы для поиска по префиксу в админке (search_fields '^title', '^author').
+# istartswith в SQLite - LIKE без учета регистра (ASCII), его обслуживает
+# только индекс с COLLATE NOCASE; в PostgreSQL - UPPER(поле::text) LIKE ...,
+# для него нужен индекс по тому же выражению с text_pattern_ops.
+# Обычные индексы book_title_idx и book_author_idx остаются для сортировки
+# по названию и точного совпадения автора.
+SEARCH_INDEXES = {
+    'book_title_search_idx': 'title',
+    'book_author_search_idx': 'author',
+}
+
+INDEX_SQL = {
+    'sqlite': 'CREATE INDEX {name} ON book_book ({column} COLLATE NOCASE)',
+    'postgresql': 'CREATE INDEX {name} ON book_book (UPPER({column}::text) text_pattern_ops)',
+}
+
+
+def create_indexes(apps, schema_editor):
+    sql = INDEX_SQL.get(schema_editor.connection.vendor)
+    if sql is None:
+        return
+    for name, column in SEARCH_INDEXES.items():
+        schema_editor.execute(sql.format(name=name, column=column))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in INDEX_SQL:
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0012_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
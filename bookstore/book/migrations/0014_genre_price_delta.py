@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-19 09:23
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_price_delta(apps, schema_editor):
+    """Считает переоценки за прошедшие дни по истории цен"""
+    BookPriceHistory = apps.get_model('book', 'BookPriceHistory')
+    GenrePriceDaily = apps.get_model('book', 'GenrePriceDaily')
+    totals = defaultdict(lambda: [0, 0])
+    last_book_id = previous = None
+    rows = BookPriceHistory.objects.order_by('book_id', 'changed_at', 'pk').values_list(
+        'book_id', 'genre', 'price_rub', 'changed_at'
+    )
+    for book_id, genre, price_rub, changed_at in rows.iterator(chunk_size=2000):
+        if book_id == last_book_id and previous[0] == genre and previous[1] != price_rub:
+            total = totals[genre, timezone.localdate(changed_at)]
+            total[0] += price_rub - previous[1]
+            total[1] += 1
+        last_book_id, previous = book_id, (genre, price_rub)
+    for (genre, day), (delta, repriced) in totals.items():
+        GenrePriceDaily.objects.filter(genre=genre, day=day).update(price_delta=delta, repriced=repriced)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0013_book_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genrepricedaily',
+            name='price_delta',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма изменений цен'),
+        ),
+        migrations.AddField(
+            model_name='genrepricedaily',
+            name='repriced',
+            field=models.PositiveIntegerField(default=0, verbose_name='Переоценено книг'),
+        ),
+        migrations.RunPython(fill_price_delta, migrations.RunPython.noop),
+    ]
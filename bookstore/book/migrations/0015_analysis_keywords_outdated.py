@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0014_genre_price_delta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booktextanalysis',
+            name='keywords_outdated',
+            field=models.BooleanField(default=False, verbose_name='Ключевые слова устарели'),
+        ),
+    ]
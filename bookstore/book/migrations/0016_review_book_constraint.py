@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-19 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Префикс баз шардов отзывов (book.sharding.SHARD_PREFIX)
+SHARD_PREFIX = 'reviews_'
+
+
+def delete_orphaned_reviews(apps, schema_editor):
+    """Удаляет отзывы удаленных книг, накопившиеся без ограничения FOREIGN KEY"""
+    Book = apps.get_model('book', 'Book')
+    BookReview = apps.get_model('book', 'BookReview')
+    db = schema_editor.connection.alias
+    BookReview.objects.using(db).exclude(book_id__in=Book.objects.using(db).values('pk')).delete()
+
+
+class AlterFieldOutsideShards(migrations.AlterField):
+    """AlterField везде, кроме шардов отзывов: в них нет таблицы книг"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not schema_editor.connection.alias.startswith(SHARD_PREFIX):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not schema_editor.connection.alias.startswith(SHARD_PREFIX):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0015_analysis_keywords_outdated'),
+    ]
+
+    operations = [
+        # Без подсказки model_name роутер шардов не пускает RunPython в шарды
+        migrations.RunPython(delete_orphaned_reviews, migrations.RunPython.noop),
+        AlterFieldOutsideShards(
+            model_name='bookreview',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='book.book', verbose_name='Книга'),
+        ),
+    ]
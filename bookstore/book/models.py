@@ -1,8 +1,30 @@
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.urls import reverse
 
+from .isbn import normalize_isbn
+from .projections import CARD_FIELDS, EXPORT_FIELDS, TABLE_FIELDS, ExportRow
+
+
+class BookQuerySet(models.QuerySet):
+    """Выборки книг с заранее заданными наборами полей"""
+
+    def for_table(self):
+        return self.only(*TABLE_FIELDS)
+
+    def for_card(self):
+        return self.only(*CARD_FIELDS)
+
+    def for_export(self):
+        return self.only(*EXPORT_FIELDS)
+
+    def export_rows(self, chunk_size=2000):
+        """Потоковая выдача ExportRow без создания экземпляров Book"""
+        rows = self.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+        return (ExportRow._make(row) for row in rows)
+
 
 class Book(models.Model):
     """Основная модель книги"""
@@ -74,6 +96,15 @@ class Book(models.Model):
         help_text='Международный стандартный книжный номер'
     )
 
+    # ISBN-13 без разделителей (book.isbn), заполняется при сохранении
+    isbn_normalized = models.CharField(
+        verbose_name='ISBN (нормализованный)',
+        max_length=13,
+        unique=True,
+        null=True,
+        editable=False
+    )
+
     publication_year = models.PositiveIntegerField(
         verbose_name='Год издания',
         null=True,
@@ -97,9 +128,24 @@ class Book(models.Model):
         help_text='Изображение обложки'
     )
 
+    # Остаток на складе; для "горячих" книг разнесен по счетчикам BookStockShard
+    stock = models.PositiveIntegerField(
+        verbose_name='Остаток на складе',
+        default=0
+    )
+
+    stock_shards = models.PositiveSmallIntegerField(
+        verbose_name='Счетчиков остатка',
+        default=0,
+        editable=False,
+        help_text='0 - остаток хранится в поле stock'
+    )
+
+    # Вычисляется из остатка (Book.save, book.stock)
     is_available = models.BooleanField(
         verbose_name='В наличии',
-        default=True
+        default=False,
+        editable=False
     )
 
     created_at = models.DateTimeField(
@@ -112,10 +158,21 @@ class Book(models.Model):
         auto_now=True
     )
 
+    objects = BookQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Книга'
         verbose_name_plural = 'Книги'
         ordering = ['-created_at']
+        # Индексы для поиска по префиксу в админке зависят от СУБД и
+        # создаются миграцией 0013_book_search_indexes
+        indexes = [
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['author'], name='book_author_idx'),
+            models.Index(fields=['isbn'], name='book_isbn_idx'),
+            models.Index(fields=['created_at'], name='book_created_at_idx'),
+            models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.author}"
@@ -123,12 +180,74 @@ class Book(models.Model):
     def get_absolute_url(self):
         return reverse('book_detail', kwargs={'pk': self.pk})
 
+    # Поля, изменения которых попадают в историю цен (BookPriceHistory)
+    HISTORY_FIELDS = ('price_rub', 'is_available')
+
+    # Поля остатка меняются атомарными UPDATE (book.stock); формы книги
+    # сохраняют ее без них (forms.StockFormMixin)
+    STOCK_FIELDS = ('stock', 'stock_shards', 'is_available')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД нужны, чтобы после save() понять, изменилась ли цена
+        instance._loaded_history_values = instance.history_values()
+        # ...и изменился ли ISBN
+        instance._loaded_isbn = instance.__dict__.get('isbn')
+        return instance
+
+    def history_values(self):
+        return tuple(self.__dict__.get(name) for name in self.HISTORY_FIELDS)
+
+    def isbn_changed(self):
+        """ISBN новой книги или измененный после загрузки из БД
+
+        Неизмененный ISBN не проверяется и не нормализуется заново: у
+        повторов, оставшихся после миграции 0010, isbn_normalized пуст,
+        и запись значения нарушила бы уникальный индекс.
+        """
+        return self._state.adding or self.__dict__.get('isbn') != getattr(self, '_loaded_isbn', None)
+
+    def clean(self):
+        if not self.isbn or not self.isbn_changed():
+            return
+        normalized = normalize_isbn(self.isbn)
+        if normalized is None:
+            raise ValidationError({'isbn': 'Некорректный ISBN: нужны 10 или 13 цифр с верной контрольной цифрой'})
+        duplicate = Book.objects.filter(isbn_normalized=normalized).exclude(pk=self.pk).first()
+        if duplicate is not None:
+            raise ValidationError({'isbn': f'Книга с этим ISBN уже есть: {duplicate}'})
+
     def save(self, *args, **kwargs):
         """Автоматическая обработка перед сохранением"""
         if self.rating is not None:
             # Округление рейтинга
             self.rating = round(float(self.rating), 1)
+        if 'isbn' in self.__dict__ and self.isbn_changed():
+            # При отложенной загрузке (only/defer) ISBN не менялся
+            self.isbn_normalized = normalize_isbn(self.isbn)
+        if 'stock' in self.__dict__ and 'stock_shards' in self.__dict__ and not self.stock_shards:
+            # Наличие книг с несколькими счетчиками обновляет book.stock
+            self.is_available = self.stock > 0
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'isbn' in update_fields:
+                update_fields.add('isbn_normalized')
+            if 'stock' in update_fields:
+                update_fields.add('is_available')
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
+        if 'isbn' in self.__dict__:
+            self._loaded_isbn = self.isbn
+
+    @property
+    def available_stock(self):
+        """Общий остаток с учетом счетчиков BookStockShard"""
+        if not self.stock_shards:
+            return self.stock
+        total = self.stock_counters.aggregate(total=models.Sum('quantity'))['total']
+        return self.stock + (total or 0)
 
     @property
     def price_category(self):
@@ -154,6 +273,10 @@ class Book(models.Model):
 
 class BookReview(models.Model):
     """Модель отзыва о книге"""
+    # Ограничение FOREIGN KEY есть только в основной базе. В шардах
+    # (book.sharding) нет таблицы книг: там его сняла миграция 0009, а
+    # миграции, пересоздающие таблицу отзывов, не должны выполняться в
+    # шардах (см. AlterFieldOutsideShards в 0016)
     book = models.ForeignKey(
         Book,
         on_delete=models.CASCADE,
@@ -186,6 +309,14 @@ class BookReview(models.Model):
         default=True
     )
 
+    sentiment = models.FloatField(
+        verbose_name='Тональность',
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='От -1 (негативный) до 1 (позитивный), заполняется командой analyze_reviews'
+    )
+
     created_at = models.DateTimeField(
         verbose_name='Дата отзыва',
         auto_now_add=True
@@ -195,11 +326,370 @@ class BookReview(models.Model):
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['book', 'is_approved', '-created_at'],
+                name='review_book_approved_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Отзыв на {self.book.title} от {self.reviewer_name}"
 
+    # Поля, от которых зависит вклад отзыва в анализ книги (BookTextAnalysis)
+    ANALYSIS_FIELDS = ('book_id', 'text', 'is_approved', 'sentiment')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД нужны, чтобы при правке снять учтенный вклад отзыва
+        instance._loaded_analysis_values = instance.analysis_values()
+        return instance
+
+    def analysis_values(self):
+        return tuple(self.__dict__.get(name) for name in self.ANALYSIS_FIELDS)
+
     @property
     def rating_stars(self):
         """Оценка в виде звезд"""
-        return '★' * self.rating + '☆' * (10 - self.rating)
\ No newline at end of file
+        return '★' * self.rating + '☆' * (10 - self.rating)
+
+
+class BookPriceHistory(models.Model):
+    """История цены и наличия книги (только добавление записей)
+
+    Поле month - ключ "партиции": выборки за период ограничиваются
+    по нему и используют индекс (month, book).
+    """
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='price_history',
+        verbose_name='Книга'
+    )
+
+    genre = models.CharField(
+        verbose_name='Жанр',
+        max_length=50,
+        choices=Book.GENRE_CHOICES
+    )
+
+    price_rub = models.DecimalField(
+        verbose_name='Цена (₽)',
+        max_digits=10,
+        decimal_places=2
+    )
+
+    is_available = models.BooleanField(
+        verbose_name='В наличии'
+    )
+
+    month = models.DateField(
+        verbose_name='Месяц'
+    )
+
+    changed_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Изменение цены'
+        verbose_name_plural = 'История цен'
+        ordering = ['-changed_at']
+        indexes = [
+            models.Index(fields=['month', 'book'], name='price_history_month_idx'),
+            models.Index(fields=['book', '-changed_at'], name='price_history_book_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id}: {self.price_rub} ₽ ({self.changed_at:%d.%m.%Y})"
+
+
+class GenrePriceDaily(models.Model):
+    """Дневная сводка цен по жанру, обновляется при каждой записи истории"""
+    genre = models.CharField(
+        verbose_name='Жанр',
+        max_length=50,
+        choices=Book.GENRE_CHOICES
+    )
+
+    day = models.DateField(
+        verbose_name='День'
+    )
+
+    min_price = models.DecimalField(
+        verbose_name='Мин. цена',
+        max_digits=10,
+        decimal_places=2
+    )
+
+    max_price = models.DecimalField(
+        verbose_name='Макс. цена',
+        max_digits=10,
+        decimal_places=2
+    )
+
+    price_sum = models.DecimalField(
+        verbose_name='Сумма цен',
+        max_digits=14,
+        decimal_places=2
+    )
+
+    samples = models.PositiveIntegerField(
+        verbose_name='Количество изменений'
+    )
+
+    # Сумма (новая цена - прежняя) по книгам, оставшимся в жанре: по ней
+    # считается изменение уровня цен жанра, а не по средним разных наборов книг
+    price_delta = models.DecimalField(
+        verbose_name='Сумма изменений цен',
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+
+    repriced = models.PositiveIntegerField(
+        verbose_name='Переоценено книг',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Дневная сводка цен'
+        verbose_name_plural = 'Дневные сводки цен'
+        ordering = ['genre', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['genre', 'day'], name='genre_price_daily_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.genre} {self.day:%d.%m.%Y}"
+
+    @property
+    def avg_price(self):
+        return self.price_sum / self.samples if self.samples else 0
+
+
+class BookTextAnalysis(models.Model):
+    """Результаты офлайн-анализа отзывов книги (команда analyze_reviews)"""
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='analysis',
+        verbose_name='Книга'
+    )
+
+    term_counts = models.JSONField(
+        verbose_name='Частоты слов',
+        default=dict
+    )
+
+    keywords = models.JSONField(
+        verbose_name='Ключевые слова',
+        default=list
+    )
+
+    sentiment_sum = models.FloatField(
+        verbose_name='Сумма тональностей',
+        default=0
+    )
+
+    reviews_analyzed = models.PositiveIntegerField(
+        verbose_name='Проанализировано отзывов',
+        default=0
+    )
+
+    # После удаления или правки отзыва TF-IDF пересчитывает analyze_reviews
+    keywords_outdated = models.BooleanField(
+        verbose_name='Ключевые слова устарели',
+        default=False
+    )
+
+    updated_at = models.DateTimeField(
+        verbose_name='Дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Анализ отзывов'
+        verbose_name_plural = 'Анализ отзывов'
+
+    def __str__(self):
+        return f"Анализ отзывов: {self.book_id}"
+
+    @property
+    def sentiment(self):
+        """Средняя тональность отзывов"""
+        if self.reviews_analyzed:
+            return self.sentiment_sum / self.reviews_analyzed
+        return 0
+
+
+class BookStockShard(models.Model):
+    """Часть остатка книги
+
+    Остаток популярной книги делится на несколько строк, и параллельные
+    покупки уменьшают разные строки, не дожидаясь блокировки одной.
+    """
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='stock_counters',
+        verbose_name='Книга'
+    )
+
+    number = models.PositiveSmallIntegerField(
+        verbose_name='Номер счетчика'
+    )
+
+    quantity = models.PositiveIntegerField(
+        verbose_name='Количество',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счетчик остатка'
+        verbose_name_plural = 'Счетчики остатка'
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'number'], name='unique_book_stock_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id}/{self.number}: {self.quantity}"
+
+
+class BookTombstone(models.Model):
+    """Отметка об удалении книги для ленты изменений"""
+    book_id = models.BigIntegerField(
+        verbose_name='ID книги'
+    )
+
+    deleted_at = models.DateTimeField(
+        verbose_name='Дата удаления',
+        default=timezone.now,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Удаленная книга'
+        verbose_name_plural = 'Удаленные книги'
+        ordering = ['deleted_at']
+
+    def __str__(self):
+        return f"Книга {self.book_id} удалена {self.deleted_at:%d.%m.%Y %H:%M}"
+
+
+class BookArchive(models.Model):
+    """Книга, перенесенная в архив (book.archive)
+
+    Поля книги, история цен и результаты анализа отзывов хранятся сжатым
+    JSON в data; отдельными колонками - то, что нужно для поиска и
+    статистики без распаковки.
+    """
+    book_id = models.BigIntegerField(
+        verbose_name='ID книги',
+        unique=True
+    )
+
+    title = models.CharField(
+        verbose_name='Название',
+        max_length=255,
+        db_index=True
+    )
+
+    author = models.CharField(
+        verbose_name='Автор',
+        max_length=255
+    )
+
+    genre = models.CharField(
+        verbose_name='Жанр',
+        max_length=50,
+        choices=Book.GENRE_CHOICES
+    )
+
+    sentiment_sum = models.FloatField(
+        verbose_name='Сумма тональностей',
+        default=0
+    )
+
+    reviews_analyzed = models.PositiveIntegerField(
+        verbose_name='Проанализировано отзывов',
+        default=0
+    )
+
+    archived_at = models.DateTimeField(
+        verbose_name='Дата архивации',
+        default=timezone.now
+    )
+
+    data = models.BinaryField(
+        verbose_name='Данные (JSON, zlib)'
+    )
+
+    class Meta:
+        verbose_name = 'Книга в архиве'
+        verbose_name_plural = 'Архив книг'
+        ordering = ['-archived_at']
+
+    def __str__(self):
+        return f"{self.title} - {self.author} (архив)"
+
+
+class ReviewArchive(models.Model):
+    """Сегмент архивированных отзывов одной книги (сжатый JSON)"""
+    book_id = models.BigIntegerField(
+        verbose_name='ID книги',
+        db_index=True
+    )
+
+    reviews_count = models.PositiveIntegerField(
+        verbose_name='Отзывов'
+    )
+
+    approved_count = models.PositiveIntegerField(
+        verbose_name='Одобренных отзывов'
+    )
+
+    rating_sum = models.PositiveIntegerField(
+        verbose_name='Сумма оценок одобренных отзывов'
+    )
+
+    oldest_at = models.DateTimeField(
+        verbose_name='Самый ранний отзыв'
+    )
+
+    newest_at = models.DateTimeField(
+        verbose_name='Самый поздний отзыв'
+    )
+
+    archived_at = models.DateTimeField(
+        verbose_name='Дата архивации',
+        default=timezone.now
+    )
+
+    data = models.BinaryField(
+        verbose_name='Отзывы (JSON, zlib)'
+    )
+
+    class Meta:
+        verbose_name = 'Архив отзывов'
+        verbose_name_plural = 'Архив отзывов'
+
+    def __str__(self):
+        return f"Отзывы книги {self.book_id}: {self.reviews_count} ({self.oldest_at:%d.%m.%Y} - {self.newest_at:%d.%m.%Y})"
+
+
+class PendingReviewManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_approved=False)
+
+
+class PendingReview(BookReview):
+    """Отзывы, ожидающие модерации"""
+    objects = PendingReviewManager()
+
+    class Meta:
+        proxy = True
+        verbose_name = 'Отзыв на модерации'
+        verbose_name_plural = 'Очередь модерации'
@@ -0,0 +1,63 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, использующий оценку числа строк вместо COUNT(*)
+
+    Для нефильтрованного списка число строк берется из статистики СУБД
+    (pg_class.reltuples в PostgreSQL, sqlite_stat1 в SQLite). Статистику
+    обновляет команда update_db_statistics (ANALYZE), ее стоит запускать
+    по расписанию. Если оценка недоступна или таблица небольшая,
+    выполняется обычный COUNT(*).
+    """
+
+    # Ниже этого порога точный подсчет дешевле, чем ошибка в оценке
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self._estimate_count()
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+    def _estimate_count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where or query.distinct:
+            return None
+
+        table = query.model._meta.db_table
+        connection = connections[self.object_list.db]
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [table]
+                )
+                row = cursor.fetchone()
+                return int(row[0]) if row and row[0] > 0 else None
+
+            if connection.vendor == 'sqlite':
+                # Таблица статистики появляется только после ANALYZE
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+                )
+                if cursor.fetchone() is None:
+                    return None
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NULL',
+                    [table]
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                        [table]
+                    )
+                    row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+
+        return None
@@ -0,0 +1,204 @@
+"""Статические копии публичных страниц каталога
+
+Команда prerender сохраняет в PRERENDER_ROOT HTML страниц книг, жанров,
+авторов и первых страниц каталога (общей и по каждому жанру). Файл
+лежит по пути URL: /book/5/ -> book/5/index.html, /?genre=SCIFI ->
+index.genre=SCIFI.html. Анонимные GET-запросы отдает nginx, не
+обращаясь к Django:
+
+    location / {
+        root /srv/bookstore/prerendered;
+        error_page 418 = @django;
+        if ($request_method !~ ^(GET|HEAD)$) { return 418; }
+        if ($http_cookie ~ "(sessionid|messages)=") { return 418; }
+        set $page index.html;
+        if ($args) { set $page -; }
+        if ($args ~ "^genre=([A-Z]+)$") { set $page index.genre=$1.html; }
+        gzip_static on;
+        try_files $uri$page @django;
+    }
+
+Рядом с каждой страницей сохраняется сжатая копия (.gz) для gzip_static.
+
+Повторный запуск перерисовывает только страницы, затронутые книгами с
+новым updated_at, удаленными книгами (BookTombstone), новыми одобренными
+отзывами и результатами analyze_reviews. Прежние жанр и автор книг
+берутся из манифеста прошлого запуска, чтобы обновить и страницы, с
+которых книга ушла.
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from urllib.parse import unquote, urlencode
+
+MANIFEST_NAME = '.prerender.json'
+
+
+def page_file(root, url):
+    """Путь файла для URL или None, если URL нельзя безопасно сохранить"""
+    path, _, query = url.partition('?')
+    segments = [segment for segment in unquote(path).split('/') if segment]
+    if any(segment in ('.', '..') or os.sep in segment for segment in segments):
+        return None
+    name = f'index.{query}.html' if query else 'index.html'
+    return os.path.join(root, *segments, name)
+
+
+def list_url(genre=None):
+    from django.urls import reverse
+
+    url = reverse('book:book_list')
+    return f'{url}?{urlencode({"genre": genre})}' if genre else url
+
+
+def genre_url(genre):
+    from django.urls import reverse
+
+    return reverse('book:genre_books', args=[genre])
+
+
+def author_url(author):
+    from django.urls import NoReverseMatch, reverse
+
+    try:
+        return reverse('book:author_books', args=[author])
+    except NoReverseMatch:
+        # Имя с "/" не помещается в сегмент URL, страница недоступна и в Django
+        return None
+
+
+def detail_url(book_id):
+    from django.urls import reverse
+
+    return reverse('book:book_detail', kwargs={'pk': book_id})
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    manifest['since'] = datetime.fromisoformat(manifest['since'])
+    manifest['books'] = {int(pk): tuple(values) for pk, values in manifest['books'].items()}
+    return manifest
+
+
+def save_manifest(root, since, books):
+    data = {
+        'since': since.isoformat(),
+        'books': {str(pk): list(values) for pk, values in books.items()},
+    }
+    write_file(os.path.join(root, MANIFEST_NAME), json.dumps(data, ensure_ascii=False).encode())
+
+
+def all_pages():
+    """Все URL для полной генерации и манифест {pk: (жанр, автор)}"""
+    from .models import Book
+
+    books = {pk: (genre, author) for pk, genre, author in Book.objects.values_list('pk', 'genre', 'author')}
+    genres = [code for code, name in Book.GENRE_CHOICES]
+    authors = set(Book.objects.filter(is_available=True).values_list('author', flat=True).distinct())
+
+    urls = [list_url()]
+    urls += [list_url(genre) for genre in genres]
+    urls += [genre_url(genre) for genre in genres]
+    urls += [author_url(author) for author in sorted(authors)]
+    urls += [detail_url(pk) for pk in books]
+    return [url for url in urls if url], books
+
+
+def changed_pages(since, books):
+    """URL страниц, затронутых изменениями после since; books обновляется на месте"""
+    from .models import Book, BookTextAnalysis, BookTombstone, BookReview
+    from .sharding import review_databases
+
+    changed = list(Book.objects.filter(updated_at__gte=since).values_list('pk', 'genre', 'author'))
+    deleted = set(BookTombstone.objects.filter(deleted_at__gte=since).values_list('book_id', flat=True))
+
+    detail_ids = {pk for pk, genre, author in changed} | deleted
+    for alias in review_databases():
+        detail_ids.update(
+            BookReview.objects.using(alias).filter(created_at__gte=since, is_approved=True)
+            .values_list('book_id', flat=True).distinct()
+        )
+    detail_ids.update(BookTextAnalysis.objects.filter(updated_at__gte=since).values_list('book_id', flat=True))
+
+    genres, authors = set(), set()
+    for pk in deleted:
+        if pk in books:
+            genres.add(books[pk][0])
+            authors.add(books[pk][1])
+            del books[pk]
+    for pk, genre, author in changed:
+        # Прежние жанр и автор - чтобы книга исчезла со старых страниц
+        if pk in books:
+            genres.add(books[pk][0])
+            authors.add(books[pk][1])
+        genres.add(genre)
+        authors.add(author)
+        books[pk] = (genre, author)
+
+    urls = []
+    if changed or deleted:
+        urls.append(list_url())
+    urls += [list_url(genre) for genre in sorted(genres)]
+    urls += [genre_url(genre) for genre in sorted(genres)]
+    urls += [author_url(author) for author in sorted(authors)]
+    urls += [detail_url(pk) for pk in sorted(detail_ids)]
+    return [url for url in urls if url]
+
+
+def init_worker():
+    # При запуске процессов через spawn Django в них еще не настроен
+    import django
+    django.setup()
+
+
+def render_pages(root, host, urls):
+    """Сохраняет страницы; возвращает [(url, статус)] (выполняется в процессе пула)
+
+    Страницы запрашиваются через полный цикл middleware, как обычный
+    анонимный запрос. Ответы, устанавливающие cookie (например, с
+    CSRF-токеном), и ошибки не сохраняются; файл страницы, вернувшей
+    404, удаляется.
+    """
+    from django.db import connections
+    from django.test import Client
+
+    client = Client(raise_request_exception=False, HTTP_HOST=host)
+    results = []
+    for url in urls:
+        path = page_file(root, url)
+        if path is None:
+            results.append((url, 'skipped'))
+            continue
+        response = client.get(url)
+        client.cookies.clear()
+        if response.status_code == 404:
+            for name in (path, f'{path}.gz'):
+                if os.path.exists(name):
+                    os.remove(name)
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+            results.append((url, 'removed'))
+        elif response.status_code != 200 or response.cookies or response.streaming:
+            results.append((url, 'skipped'))
+        else:
+            write_file(path, response.content)
+            write_file(f'{path}.gz', gzip.compress(response.content, mtime=0))
+            results.append((url, 'rendered'))
+    connections.close_all()
+    return results
+
+
+def write_file(path, content):
+    """Запись через временный файл: nginx не отдаст недописанную страницу"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(content)
+    os.replace(temporary, path)
@@ -0,0 +1,52 @@
+"""Наборы полей и легкие типы строк для списков и выгрузок
+
+Длинные текстовые поля (short_description, reading_reason) нужны только
+на детальной странице, поэтому списки и экспорт их не загружают.
+"""
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Строка таблицы каталога (book/book_row.html)
+TABLE_FIELDS = (
+    'id', 'title', 'author', 'genre', 'price_rub', 'rating',
+    'publication_year', 'isbn', 'is_available', 'updated_at',
+)
+
+# Краткая карточка книги (сайдбары, похожие книги)
+CARD_FIELDS = (
+    'id', 'title', 'author', 'genre', 'price_rub', 'rating', 'is_available',
+)
+
+# Экспорт в CSV и лента изменений
+EXPORT_FIELDS = (
+    'id', 'title', 'author', 'genre', 'price_rub', 'rating',
+    'publication_year', 'page_count', 'isbn', 'is_available',
+    'created_at', 'updated_at',
+)
+
+
+class ExportRow(NamedTuple):
+    """Строка экспорта без экземпляра модели (кортеж, без __dict__)"""
+    id: int
+    title: str
+    author: str
+    genre: str
+    price_rub: Decimal
+    rating: Optional[Decimal]
+    publication_year: Optional[int]
+    page_count: Optional[int]
+    isbn: Optional[str]
+    is_available: bool
+    created_at: datetime
+    updated_at: datetime
+
+    def get_genre_display(self):
+        return genre_names().get(self.genre, self.genre)
+
+
+@lru_cache(maxsize=None)
+def genre_names():
+    from .models import Book
+    return dict(Book.GENRE_CHOICES)
@@ -0,0 +1,95 @@
+"""Ограничение частоты запросов к "дорогим" и анонимным страницам
+
+Счетчики хранятся в кэше Django (settings.RATELIMIT_CACHE), поэтому при
+общем бэкенде (Redis, Memcached) лимит действует на все воркеры сразу.
+Используется скользящее окно из двух фиксированных окон: текущее
+значение оценивается как счетчик текущего окна плюс доля счетчика
+предыдущего окна. Это требует одного атомарного incr на счетчик.
+
+Запрос всегда учитывается в счетчике IP-адреса, а у вошедшего
+пользователя - еще и в его собственном (client_keys).
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60)"""
+    count, _, unit = rate.partition('/')
+    return int(count), RATE_UNITS[unit]
+
+
+def client_ip(request):
+    """IP-адрес клиента"""
+    if getattr(settings, 'RATELIMIT_TRUST_FORWARDED', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        return forwarded.split(',')[0].strip() or request.META.get('REMOTE_ADDR', '')
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_keys(request):
+    """Счетчики, в которых учитывается запрос: IP-адрес и вошедший пользователь
+
+    Ключ сессии из cookie не используется: его присылает сам клиент, и бот
+    с новой cookie на каждый запрос получал бы каждый раз пустой счетчик.
+    """
+    keys = [f'ip:{client_ip(request)}']
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        keys.append(f'user:{user.pk}')
+    return keys
+
+
+def is_limited(group, key, rate, now=None):
+    """Учитывает запрос и сообщает, превышен ли лимит"""
+    limit, window = parse_rate(rate)
+    now = time.time() if now is None else now
+    current_window = int(now // window)
+    elapsed = (now % window) / window
+    cache = caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+    prefix = f'rl:{group}:{key}'
+    current_key = f'{prefix}:{current_window}'
+    # add() не перезаписывает существующий счетчик, incr() атомарен в общих бэкендах
+    cache.add(current_key, 0, timeout=window * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Ключ успел истечь между add() и incr()
+        cache.set(current_key, 1, timeout=window * 2)
+        current = 1
+    previous = cache.get(f'{prefix}:{current_window - 1}', 0)
+
+    return previous * (1 - elapsed) + current > limit
+
+
+def ratelimit(group, rate, methods=('POST',), condition=None):
+    """Декоратор представления: при превышении лимита возвращает 429
+
+    condition - необязательная функция от request; если она возвращает
+    False, запрос не учитывается (например, пустой поисковый запрос).
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (getattr(settings, 'RATELIMIT_ENABLED', True)
+                    and request.method in methods
+                    and (condition is None or condition(request))
+                    # Запрос учитывается во всех счетчиках, отказ - если превышен любой
+                    and any([is_limited(group, key, rate) for key in client_keys(request)])):
+                response = HttpResponse(
+                    'Слишком много запросов. Попробуйте позже.',
+                    status=429,
+                    content_type='text/plain; charset=utf-8'
+                )
+                response['Retry-After'] = str(parse_rate(rate)[1])
+                return response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,56 @@
+"""Постраничная выдача одобренных отзывов книги
+
+Используется keyset-пагинация по (created_at, id): следующая страница
+начинается сразу после последнего показанного отзыва, поэтому запрос
+не зависит от глубины прокрутки и использует индекс
+(book, is_approved, created_at).
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .archive import archived_reviews
+
+REVIEWS_PAGE_SIZE = 10
+
+
+def make_cursor(review):
+    return f'{review.created_at.isoformat()}|{review.pk}'
+
+
+def parse_cursor(cursor):
+    """Разбирает курсор вида "<created_at>|<id>", при ошибке возвращает None"""
+    created_at, _, pk = (cursor or '').partition('|')
+    try:
+        created_at = parse_datetime(created_at)
+    except ValueError:
+        return None
+    if created_at is None or not pk.isdigit():
+        return None
+    return created_at, int(pk)
+
+
+def approved_reviews_page(book, cursor=None, size=REVIEWS_PAGE_SIZE):
+    """Возвращает (отзывы, курсор следующей страницы или None)
+
+    Когда рабочие отзывы заканчиваются, страница дополняется отзывами из
+    архива (book.archive) в том же порядке.
+    """
+    queryset = book.reviews.filter(is_approved=True).order_by('-created_at', '-pk')
+
+    position = parse_cursor(cursor)
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+
+    # Лишняя запись показывает, есть ли следующая страница, без COUNT(*)
+    reviews = list(queryset[:size + 1])
+    if len(reviews) <= size:
+        reviews += archived_reviews(book.pk, position, size + 1)
+        reviews.sort(key=lambda review: (review.created_at, review.pk), reverse=True)
+        reviews = reviews[:size + 1]
+    if len(reviews) > size:
+        reviews = reviews[:size]
+        return reviews, make_cursor(reviews[-1])
+    return reviews, None
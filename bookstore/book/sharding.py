@@ -0,0 +1,129 @@
+"""Шардирование отзывов по нескольким файлам SQLite
+
+Включается настройкой REVIEW_SHARDS (переменная окружения
+BOOKSTORE_REVIEW_SHARDS). Отзывы книги хранятся в базе
+reviews_<book_id % REVIEW_SHARDS>, поэтому запись отзывов не конкурирует
+за блокировку основной базы с правками каталога в админке, а отзывы
+разных книг пишутся в разные файлы параллельно.
+
+Все отзывы одной книги лежат в одном шарде: страница книги и подгрузка
+отзывов читают один файл, агрегаты по всем отзывам собираются функциями
+этого модуля обходом шардов.
+
+ID отзывов уникальны по всем шардам: шард N выдает ID начиная с
+(N + 1) << REVIEW_ID_BITS (reserve_review_ids после migrate), отзывы,
+перенесенные из основной базы, сохраняют прежние ID.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from .models import Book, BookReview, ReviewArchive
+
+SHARD_PREFIX = 'reviews_'
+
+# Диапазон ID отзывов одного шарда
+REVIEW_ID_BITS = 40
+
+
+def shard_count():
+    return getattr(settings, 'REVIEW_SHARDS', 0)
+
+
+def shard_for_book(book_id):
+    """Имя базы с отзывами книги"""
+    if not shard_count():
+        return 'default'
+    return f'{SHARD_PREFIX}{book_id % shard_count()}'
+
+
+def review_databases():
+    """Все базы, в которых могут храниться отзывы"""
+    if not shard_count():
+        return ['default']
+    return [f'{SHARD_PREFIX}{number}' for number in range(shard_count())]
+
+
+def delete_reviews(book_ids):
+    """Удаляет отзывы книг во всех базах одним DELETE на базу"""
+    for alias in review_databases():
+        reviews = BookReview.objects.using(alias).filter(book_id__in=book_ids)
+        reviews._raw_delete(alias)
+
+
+def count_reviews(book_ids):
+    """Количество отзывов книг по всем базам"""
+    return sum(
+        BookReview.objects.using(alias).filter(book_id__in=book_ids).count()
+        for alias in review_databases()
+    )
+
+
+def books_with_reviews_count():
+    """Количество книг, у которых есть хотя бы один отзыв, по всем шардам и архиву"""
+    # Сегменты архива есть и у архивированных книг - учитываются только книги каталога
+    archived = Q(pk__in=ReviewArchive.objects.values('book_id'))
+    if not shard_count():
+        return Book.objects.filter(Q(reviews__isnull=False) | archived).distinct().count()
+    book_ids = set(Book.objects.filter(archived).values_list('pk', flat=True))
+    for alias in review_databases():
+        book_ids.update(
+            BookReview.objects.using(alias).order_by().values_list('book_id', flat=True).distinct()
+        )
+    return len(book_ids)
+
+
+def reserve_review_ids(using, **kwargs):
+    """Сдвигает счетчик ID отзывов шарда в его диапазон (сигнал post_migrate)"""
+    if not using.startswith(SHARD_PREFIX):
+        return
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    first_id = (int(using[len(SHARD_PREFIX):]) + 1) << REVIEW_ID_BITS
+    table = BookReview._meta.db_table
+    with connection.cursor() as cursor:
+        # Счетчик AUTOINCREMENT хранится в sqlite_sequence и только растет
+        cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, first_id - 1])
+        elif row[0] < first_id - 1:
+            cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [first_id - 1, table])
+
+
+class ReviewShardRouter:
+    """Направляет запросы к отзывам в шард книги
+
+    Запросы без подсказки о книге идут в основную базу, поэтому списки
+    отзывов явно выбирают шард через using() (см. ReviewShardAdminMixin).
+    """
+
+    def _shard(self, model, hints):
+        if model._meta.concrete_model is not BookReview:
+            # Явно, иначе Django выберет базу экземпляра из подсказки, и книга
+            # отзыва из шарда (review.book, prefetch_related) читалась бы из шарда
+            return 'default'
+        instance = hints.get('instance')
+        if isinstance(instance, Book) and instance.pk is not None:
+            return shard_for_book(instance.pk)
+        if isinstance(instance, BookReview) and instance.book_id is not None:
+            return shard_for_book(instance.book_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {type(obj1)._meta.concrete_model, type(obj2)._meta.concrete_model} <= {Book, BookReview}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not db.startswith(SHARD_PREFIX):
+            return None
+        # В шардах есть только таблица отзывов
+        return app_label == 'book' and model_name in ('bookreview', 'pendingreview')
@@ -0,0 +1,104 @@
+"""Список "Недавно добавленные" для каталога
+
+Списки (общий и по каждому жанру) хранятся в кэше и обновляются
+инкрементально при сохранении книги: новая запись добавляется в
+ограниченную кучу из SIDEBAR_SIZE элементов. Если по кэшу нельзя
+узнать, какая книга займет освободившееся место (книга удалена или
+перешла в другой жанр), список сбрасывается и строится заново одним
+запросом при следующем обращении.
+"""
+import heapq
+from datetime import datetime
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+from .models import Book
+
+SIDEBAR_SIZE = 5
+
+# Страховка от расхождений при параллельных обновлениях из разных процессов
+SIDEBAR_TIMEOUT = 60 * 60
+
+KINDS = ('recent',)
+
+
+class SidebarBook(NamedTuple):
+    pk: int
+    title: str
+    author: str
+    created_at: datetime
+
+
+def sort_key(kind, entry):
+    return entry.created_at, entry.pk
+
+
+def cache_key(kind, genre=None):
+    # v2: записи без рейтинга; прежние записи в общем кэше не читаются
+    return f'sidebar:v2:{kind}:{genre or "all"}'
+
+
+def get_sidebar(kind, genre=None):
+    """Список книг для сайдбара; запрос к БД - только если кэш пуст"""
+    key = cache_key(kind, genre)
+    entries = cache.get(key)
+    if entries is None:
+        entries = build_sidebar(kind, genre)
+        cache.set(key, entries, SIDEBAR_TIMEOUT)
+    return entries
+
+
+def build_sidebar(kind, genre=None):
+    queryset = Book.objects.all()
+    if genre:
+        queryset = queryset.filter(genre=genre)
+    queryset = queryset.order_by('-created_at', '-pk')
+    rows = queryset.values_list(*SidebarBook._fields)[:SIDEBAR_SIZE]
+    return [SidebarBook._make(row) for row in rows]
+
+
+def all_keys():
+    genres = [None] + [code for code, name in Book.GENRE_CHOICES]
+    return [cache_key(kind, genre) for kind in KINDS for genre in genres]
+
+
+def book_saved(book):
+    """Учитывает сохраненную книгу во всех затронутых списках"""
+    candidate = SidebarBook(book.pk, book.title, book.author, book.created_at)
+    cached = cache.get_many(all_keys())
+    updated = {}
+    stale = []
+
+    for key, entries in cached.items():
+        kind, genre = key.split(':')[-2:]
+        others = [entry for entry in entries if entry.pk != book.pk]
+        previous = next((entry for entry in entries if entry.pk == book.pk), None)
+        belongs = genre in ('all', book.genre)
+
+        if previous is not None and len(entries) == SIDEBAR_SIZE and (
+                not belongs or sort_key(kind, candidate) < sort_key(kind, previous)):
+            # Книга могла уступить место той, которой нет в кэше
+            stale.append(key)
+            continue
+
+        if belongs:
+            others.append(candidate)
+        updated[key] = heapq.nlargest(SIDEBAR_SIZE, others, key=lambda entry: sort_key(kind, entry))
+
+    cache.set_many(updated, SIDEBAR_TIMEOUT)
+    cache.delete_many(stale)
+
+
+def book_deleted(book_id):
+    """Сбрасывает списки, в которых была удаленная книга"""
+    cached = cache.get_many(all_keys())
+    cache.delete_many([
+        key for key, entries in cached.items()
+        if any(entry.pk == book_id for entry in entries)
+    ])
+
+
+def invalidate():
+    """Сброс всех списков (после пакетных UPDATE/DELETE без сигналов)"""
+    cache.delete_many(all_keys())
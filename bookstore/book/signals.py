@@ -0,0 +1,104 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Book, BookReview, BookTombstone, PendingReview, ReviewArchive
+from .sharding import delete_reviews, shard_count
+
+# book.history, book.analysis и book.sidebars импортируются в самих
+# обработчиках: модуль загружается в BookConfig.ready() при запуске воркера
+
+
+@receiver(post_save, sender=Book)
+def record_price_history(sender, instance, created, raw=False, **kwargs):
+    """Пишет историю цены при создании книги и при изменении цены/наличия"""
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_history_values', None)
+    if created or loaded != instance.history_values():
+        from .history import record_book
+
+        record_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def record_tombstone(sender, instance, **kwargs):
+    """Сохраняет отметку об удалении для ленты изменений"""
+    BookTombstone.objects.create(book_id=instance.pk)
+    # Архивные отзывы удаляются вместе с книгой (book.archive)
+    segments = ReviewArchive.objects.filter(book_id=instance.pk)
+    segments._raw_delete(segments.db)
+    if shard_count():
+        # Каскад ORM удаляет отзывы только в основной базе
+        delete_reviews([instance.pk])
+
+
+@receiver(post_save, sender=Book)
+def update_sidebars(sender, instance, raw=False, **kwargs):
+    if not raw:
+        from . import sidebars
+
+        sidebars.book_saved(instance)
+
+
+@receiver(post_delete, sender=Book)
+def remove_from_sidebars(sender, instance, **kwargs):
+    from . import sidebars
+
+    sidebars.book_deleted(instance.pk)
+
+
+# Очередь модерации (PendingReview) - прокси: сигналы приходят с ее sender
+@receiver(pre_save, sender=BookReview)
+@receiver(pre_save, sender=PendingReview)
+def forget_changed_review(sender, instance, raw=False, **kwargs):
+    """Правка, снятие одобрения или перенос учтенного анализом отзыва
+
+    Вклад отзыва в анализ книги снимается, одобренный отзыв заново
+    проанализирует analyze_reviews.
+    """
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_analysis_values', None)
+    # Отзыв не учтен в анализе или загружен не полностью (only/defer)
+    if loaded is None or loaded[3] is None or None in loaded[:3]:
+        return
+    if loaded[:3] == instance.analysis_values()[:3]:
+        return
+    from .analysis import forget_reviews
+
+    book_id, text, _, score = loaded
+    forget_reviews([(book_id, text, score)])
+    instance.sentiment = None
+
+
+@receiver(post_save, sender=BookReview)
+@receiver(post_save, sender=PendingReview)
+def remember_analysis_values(sender, instance, **kwargs):
+    instance._loaded_analysis_values = instance.analysis_values()
+
+
+@receiver(post_delete, sender=BookReview)
+@receiver(post_delete, sender=PendingReview)
+def forget_deleted_review(sender, instance, origin=None, **kwargs):
+    """Удаленный или отклоненный отзыв больше не влияет на анализ книги"""
+    if _deleting_book(origin):
+        # Удаляется сама книга, анализ удалится вместе с ней
+        return
+    if instance.sentiment is not None:
+        from .analysis import forget_reviews
+
+        forget_reviews([(instance.book_id, instance.text, instance.sentiment)])
+
+
+@receiver(post_delete, sender=BookReview)
+@receiver(post_delete, sender=PendingReview)
+def touch_book_of_deleted_review(sender, instance, origin=None, **kwargs):
+    """Удаление одобренного отзыва меняет страницу книги (prerender, кэш строки)"""
+    if instance.is_approved and not _deleting_book(origin):
+        Book.objects.filter(pk=instance.book_id).update(updated_at=timezone.now())
+
+
+def _deleting_book(origin):
+    """Отзыв удаляется каскадом вместе с книгой"""
+    return isinstance(origin, Book) or getattr(origin, 'model', None) is Book
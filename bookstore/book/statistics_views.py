@@ -0,0 +1,113 @@
+"""Страница статистики
+
+Вынесена из views.py: агрегаты и сводки нужны только этой странице,
+модуль загружается при первом обращении к ней (см. urls.lazy_view).
+"""
+from datetime import timedelta
+
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.utils import timezone
+from django.views.generic import TemplateView
+
+from .history import price_trends
+from .models import Book, BookArchive, BookTextAnalysis
+from .sharding import books_with_reviews_count
+
+
+class StatisticsView(TemplateView):
+    """Страница расширенной статистики"""
+    template_name = 'book/statistics.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        # Общая статистика
+        total_books = Book.objects.count()
+        archived_books = BookArchive.objects.count()
+        available_books = Book.objects.filter(is_available=True).count()
+        books_with_reviews = books_with_reviews_count()
+
+        # Статистика по ценам
+        price_stats = Book.objects.aggregate(
+            avg_price=Avg('price_rub'),
+            min_price=Min('price_rub'),
+            max_price=Max('price_rub'),
+            total_value=Sum('price_rub')
+        )
+
+        # Статистика по жанрам
+        genre_stats = []
+        for genre_code, genre_name in Book.GENRE_CHOICES:
+            count = Book.objects.filter(genre=genre_code).count()
+            if count > 0:
+                avg_price = Book.objects.filter(genre=genre_code).aggregate(
+                    Avg('price_rub')
+                )['price_rub__avg'] or 0
+                genre_stats.append({
+                    'name': genre_name,
+                    'count': count,
+                    'percentage': (count / total_books * 100) if total_books > 0 else 0,
+                    'avg_price': avg_price
+                })
+
+        # Книги по годам
+        current_year = timezone.now().year
+        year_groups = {}
+        for year in range(2000, current_year + 1, 5):
+            next_year = year + 4 if year + 4 <= current_year else current_year
+            count = Book.objects.filter(
+                publication_year__gte=year,
+                publication_year__lte=next_year
+            ).count()
+            if count > 0:
+                year_groups[f'{year}-{next_year}'] = count
+
+        # Тональность отзывов по жанрам (по результатам analyze_reviews,
+        # включая архивированные книги)
+        genre_names = dict(Book.GENRE_CHOICES)
+        sentiment_sums = {}
+        rows = list(BookTextAnalysis.objects.values(genre=F('book__genre')).annotate(
+            sentiment_sum=Sum('sentiment_sum'),
+            reviews=Sum('reviews_analyzed')
+        ).order_by())
+        rows += BookArchive.objects.values('genre').annotate(
+            sentiment_sum=Sum('sentiment_sum'),
+            reviews=Sum('reviews_analyzed')
+        ).order_by()
+        for row in rows:
+            total = sentiment_sums.setdefault(row['genre'], [0, 0])
+            total[0] += row['sentiment_sum']
+            total[1] += row['reviews']
+        sentiment_stats = [
+            {
+                'name': genre_names.get(genre, genre),
+                'reviews': reviews,
+                'sentiment': sentiment_sum / reviews,
+            }
+            for genre, (sentiment_sum, reviews) in sorted(sentiment_sums.items())
+            if reviews
+        ]
+
+        # Топ авторов
+        top_authors = Book.objects.values('author').annotate(
+            book_count=Count('id'),
+            avg_rating=Avg('rating')
+        ).order_by('-book_count')[:10]
+
+        context.update({
+            'total_books': total_books,
+            'archived_books': archived_books,
+            'available_books': available_books,
+            'books_with_reviews': books_with_reviews,
+            'price_stats': price_stats,
+            'genre_stats': sorted(genre_stats, key=lambda x: x['count'], reverse=True),
+            'year_groups': year_groups,
+            'top_authors': top_authors,
+            'price_trends': price_trends(),
+            'sentiment_stats': sentiment_stats,
+            'recent_month': Book.objects.filter(
+                created_at__gte=timezone.now() - timedelta(days=30)
+            ).count(),
+        })
+
+        return context
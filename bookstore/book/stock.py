@@ -0,0 +1,188 @@
+"""Остатки книг на складе
+
+Списание выполняется одним условным UPDATE (stock = stock - n WHERE
+stock >= n): проверка и изменение атомарны, поэтому параллельные покупки
+не продают больше, чем есть, и не требуют SELECT ... FOR UPDATE.
+
+Остаток популярной книги можно разделить на несколько счетчиков
+(BookStockShard): покупки выбирают счетчик случайно, и строки блокируются
+разными транзакциями. Поле Book.stock у таких книг равно 0.
+
+is_available меняется только при переходе остатка через ноль, тем же
+UPDATE, что и остаток (у книг со счетчиками - в одной транзакции с
+изменением счетчика). Вместе с ним обновляются updated_at (кэш строки
+каталога, лента изменений) и история цен. Количество экземпляров в
+кэшируемые страницы не выводится.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .bulk import update_in_batches
+from .history import record_changes
+from .models import Book, BookStockShard
+
+MAX_STOCK_SHARDS = 64
+
+
+def reserve(book_id, quantity=1):
+    """Списывает quantity экземпляров; False, если столько нет"""
+    _check_quantity(quantity)
+    books = Book.objects.filter(pk=book_id, stock_shards=0)
+    # Параллельная поставка между UPDATE может изменить остаток так, что не
+    # подойдет ни одно условие, - тогда попытка повторяется
+    while True:
+        if books.filter(stock__gt=quantity).update(stock=F('stock') - quantity):
+            return True
+        if books.filter(stock=quantity).update(stock=0, is_available=False, updated_at=timezone.now()):
+            _record_availability(book_id)
+            return True
+        if not books.filter(stock__gte=quantity).exists():
+            break
+
+    shards = Book.objects.filter(pk=book_id).values_list('stock_shards', flat=True).first()
+    if not shards:
+        return False
+    # Списание целиком из одного счетчика: при раздробленном остатке
+    # крупный заказ может не пройти, хотя в сумме экземпляров хватает
+    numbers = list(range(shards))
+    random.shuffle(numbers)
+    for number in numbers:
+        counter = BookStockShard.objects.filter(book_id=book_id, number=number)
+        with transaction.atomic():
+            if not counter.filter(quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+                continue
+            if counter.filter(quantity=0).exists():
+                _refresh_availability(book_id)
+        return True
+    return False
+
+
+def release(book_id, quantity=1):
+    """Возвращает quantity экземпляров на склад (отмена заказа, поставка)"""
+    _check_quantity(quantity)
+    books = Book.objects.filter(pk=book_id, stock_shards=0)
+    # Наличие меняется тем же UPDATE, что и остаток: отдельный UPDATE после
+    # параллельной покупки последнего экземпляра вернул бы книгу в продажу
+    # с нулевым остатком. Если между запросами наличие успело измениться,
+    # попытка повторяется
+    while True:
+        if books.filter(is_available=True).update(stock=F('stock') + quantity):
+            return
+        if books.filter(is_available=False).update(
+            stock=F('stock') + quantity, is_available=True, updated_at=timezone.now()
+        ):
+            _record_availability(book_id)
+            return
+        if not books.exists():
+            break
+
+    shards = Book.objects.filter(pk=book_id).values_list('stock_shards', flat=True).first()
+    if not shards:
+        return
+    with transaction.atomic():
+        BookStockShard.objects.filter(book_id=book_id, number=random.randrange(shards)).update(
+            quantity=F('quantity') + quantity
+        )
+        _refresh_availability(book_id)
+
+
+def adjust_stock(book_id, delta):
+    """Изменяет остаток на delta (правка остатка в форме книги)
+
+    Увеличение - поставка (release). Уменьшение - условный UPDATE: если
+    с тех пор продано больше, остаток обнуляется, а не уходит в минус.
+    У книг с несколькими счетчиками остаток через форму не меняется.
+    """
+    if delta > 0:
+        release(book_id, delta)
+        return
+    if not delta:
+        return
+    books = Book.objects.filter(pk=book_id, stock_shards=0)
+    # Между UPDATE параллельная покупка или поставка может изменить
+    # остаток так, что не подойдет ни одно условие, - тогда попытка повторяется
+    while True:
+        if books.filter(stock__gt=-delta).update(stock=F('stock') + delta):
+            return
+        emptied = books.filter(stock__lte=-delta)
+        if emptied.filter(is_available=True).update(stock=0, is_available=False, updated_at=timezone.now()):
+            _record_availability(book_id)
+            return
+        if emptied.filter(is_available=False).update(stock=0):
+            return
+        if not books.exists():
+            # Книга удалена или ее остаток разделен на счетчики
+            return
+
+
+def set_stock_shards(book_id, shards):
+    """Делит остаток книги на shards счетчиков (0 - вернуть остаток в Book.stock)"""
+    shards = min(shards, MAX_STOCK_SHARDS)
+    with transaction.atomic():
+        book = Book.objects.select_for_update().only('stock').get(pk=book_id)
+        counters = BookStockShard.objects.select_for_update().filter(book_id=book_id)
+        total = book.stock + sum(counter.quantity for counter in counters)
+        counters.delete()
+
+        if shards:
+            share, remainder = divmod(total, shards)
+            BookStockShard.objects.bulk_create(
+                BookStockShard(book_id=book_id, number=number, quantity=share + (number < remainder))
+                for number in range(shards)
+            )
+            Book.objects.filter(pk=book_id).update(stock=0, stock_shards=shards)
+        else:
+            Book.objects.filter(pk=book_id).update(stock=total, stock_shards=0)
+    return total
+
+
+def set_stock_in_batches(queryset, quantity, progress=None):
+    """Устанавливает одинаковый остаток выбранным книгам (счетчики сбрасываются)"""
+    counters = BookStockShard.objects.filter(book_id__in=queryset.values('pk'))
+    counters._raw_delete(counters.db)
+    return update_in_batches(
+        queryset, progress=progress,
+        stock=quantity, stock_shards=0, is_available=quantity > 0
+    )
+
+
+def add_stock_in_batches(queryset, quantity, progress=None):
+    """Поставка: добавляет quantity экземпляров каждой выбранной книге"""
+    updated = update_in_batches(
+        queryset.filter(stock_shards=0), progress=progress,
+        stock=F('stock') + quantity, is_available=True
+    )
+    for book_id in queryset.filter(stock_shards__gt=0).values_list('pk', flat=True):
+        release(book_id, quantity)
+        updated += 1
+    return updated
+
+
+def _check_quantity(quantity):
+    if quantity < 1:
+        raise ValueError(f'Количество должно быть положительным: {quantity}')
+
+
+def _refresh_availability(book_id):
+    """Пересчитывает наличие книги с несколькими счетчиками по их сумме
+
+    Вызывается в транзакции после изменения счетчика. Строка книги
+    блокируется, поэтому пересчеты одной книги идут по очереди и каждый
+    видит счетчики, зафиксированные предыдущим.
+    """
+    book = Book.objects.select_for_update().filter(pk=book_id).only('stock', 'is_available').first()
+    if book is None:
+        return
+    total = BookStockShard.objects.filter(book_id=book_id).aggregate(total=Sum('quantity'))['total']
+    in_stock = book.stock + (total or 0) > 0
+    if in_stock != book.is_available:
+        Book.objects.filter(pk=book_id).update(is_available=in_stock, updated_at=timezone.now())
+        _record_availability(book_id)
+
+
+def _record_availability(book_id):
+    record_changes(Book.objects.filter(pk=book_id).values_list('pk', 'genre', 'price_rub', 'is_available'))
+
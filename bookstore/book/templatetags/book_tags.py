@@ -0,0 +1,22 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+# Строка таблицы не зависит от пользователя, поэтому ее HTML можно
+# переиспользовать, пока книга не изменилась (ключ включает updated_at)
+BOOK_ROW_TIMEOUT = 60 * 60 * 24
+
+
+@register.simple_tag
+def book_row(book):
+    """Строка таблицы каталога с кэшированием отрендеренного HTML"""
+    key = f'book_row:{book.pk}:{book.updated_at.timestamp()}'
+    html = cache.get(key)
+    if html is None:
+        stars = '★' * min(int(book.rating), 5) if book.rating else ''
+        html = get_template('book/book_row.html').render({'book': book, 'stars': stars})
+        cache.set(key, html, BOOK_ROW_TIMEOUT)
+    return mark_safe(html)
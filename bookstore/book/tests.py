@@ -1,3 +1,336 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import BookForm
+from .isbn import normalize_isbn
+from .models import Book
+from .ratelimit import is_limited
+from .reviews import approved_reviews_page
+from .stock import release, reserve, set_stock_shards
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_contact_returns_429_after_limit(self):
+        url = reverse('book:contact')
+        statuses = [self.client.post(url, {}).status_code for _ in range(4)]
+        self.assertNotIn(429, statuses[:3])
+        self.assertEqual(statuses[3], 429)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_disabled(self):
+        url = reverse('book:contact')
+        statuses = [self.client.post(url, {}).status_code for _ in range(5)]
+        self.assertNotIn(429, statuses)
+
+    def test_rotating_session_cookie_does_not_reset_limit(self):
+        url = reverse('book:contact')
+        statuses = []
+        for number in range(4):
+            self.client.cookies['sessionid'] = f'{number:032d}'
+            statuses.append(self.client.post(url, {}).status_code)
+        self.assertEqual(statuses[3], 429)
+
+    def test_logged_in_user_is_limited_on_any_address(self):
+        user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(user)
+        url = reverse('book:contact')
+        statuses = [
+            self.client.post(url, {}, REMOTE_ADDR=f'10.0.0.{number}').status_code
+            for number in range(4)
+        ]
+        self.assertNotIn(429, statuses[:3])
+        self.assertEqual(statuses[3], 429)
+
+    def test_window_rollover(self):
+        # 3 запроса в начале окна исчерпывают лимит 3/m
+        for _ in range(3):
+            self.assertFalse(is_limited('test', 'client', '3/m', now=6000))
+        self.assertTrue(is_limited('test', 'client', '3/m', now=6010))
+        # В конце следующего окна вклад предыдущего почти исчез
+        self.assertFalse(is_limited('test', 'client', '3/m', now=6115))
+        # Окно через одно начинается с нуля
+        for _ in range(3):
+            self.assertFalse(is_limited('test', 'other', '3/m', now=6000))
+        self.assertFalse(is_limited('test', 'other', '3/m', now=6120 + 60))
+
+    def test_clients_are_counted_separately(self):
+        for _ in range(3):
+            is_limited('test', 'first', '3/m', now=6000)
+        self.assertTrue(is_limited('test', 'first', '3/m', now=6001))
+        self.assertFalse(is_limited('test', 'second', '3/m', now=6001))
+
+
+def run_in_threads(target, count):
+    """Запускает target одновременно в count потоках"""
+    barrier = threading.Barrier(count)
+
+    def run():
+        barrier.wait()
+        try:
+            target()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class RateLimitConcurrencyTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_parallel_requests_share_one_counter(self):
+        allowed = []
+        timings = []
+
+        def request():
+            for _ in range(25):
+                started = time.perf_counter()
+                limited = is_limited('test', 'client', '100/m', now=6000)
+                timings.append(time.perf_counter() - started)
+                allowed.append(not limited)
+
+        run_in_threads(request, 8)
+
+        # incr атомарен: ровно лимит запросов из 200 одновременных
+        self.assertEqual(allowed.count(True), 100)
+        # Накладные расходы на запрос - доли миллисекунды (кэш в памяти)
+        self.assertLess(sum(timings) / len(timings), 0.005)
+
+
+class ReserveConcurrencyTests(TransactionTestCase):
+    def test_parallel_reserve_does_not_oversell(self):
+        book = Book.objects.create(title='Идиот', author='Достоевский', stock=10)
+        results = []
+
+        def buy():
+            for _ in range(3):
+                results.append(reserve(book.pk))
+
+        run_in_threads(buy, 8)
+
+        book.refresh_from_db()
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(book.stock, 0)
+        self.assertFalse(book.is_available)
+
+    def test_release_and_reserve_of_last_copy(self):
+        book = Book.objects.create(title='Идиот', author='Достоевский', stock=0)
+        self.assertFalse(Book.objects.get(pk=book.pk).is_available)
+        release(book.pk)
+        self.assertTrue(Book.objects.get(pk=book.pk).is_available)
+        self.assertTrue(reserve(book.pk))
+        book.refresh_from_db()
+        self.assertEqual(book.stock, 0)
+        self.assertFalse(book.is_available)
+
+    def test_reserve_between_release_statements(self):
+        # Покупка выполняется сразу после первого UPDATE остатка в release()
+        book = Book.objects.create(title='Идиот', author='Достоевский', stock=0)
+        interleaved = []
+
+        def buy_after_stock_update(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if not interleaved and sql.startswith('UPDATE "book_book"') and '"stock"' in sql \
+                    and context['cursor'].rowcount:
+                interleaved.append(None)
+                interleaved[0] = reserve(book.pk)
+            return result
+
+        with connection.execute_wrapper(buy_after_stock_update):
+            release(book.pk)
+
+        self.assertEqual(interleaved, [True])
+        book.refresh_from_db()
+        self.assertEqual(book.stock, 0)
+        self.assertFalse(book.is_available)
+
+    def test_parallel_release_and_reserve_keep_availability(self):
+        # Поставка и покупка последнего экземпляра вперемешку: наличие
+        # должно совпадать с остатком, а не с тем, кто записал последним
+        plain = Book.objects.create(title='Идиот', author='Достоевский', stock=0)
+        split = Book.objects.create(title='Бесы', author='Достоевский', stock=0)
+        set_stock_shards(split.pk, 4)
+        sold = {plain.pk: [], split.pk: []}
+
+        def deliver_and_buy():
+            for _ in range(20):
+                for book in (plain, split):
+                    release(book.pk)
+                    sold[book.pk].append(reserve(book.pk))
+
+        run_in_threads(deliver_and_buy, 4)
+
+        for book in (plain, split):
+            book = Book.objects.get(pk=book.pk)
+            self.assertEqual(book.available_stock, 80 - sold[book.pk].count(True))
+            self.assertEqual(book.is_available, book.available_stock > 0)
+        # У книги без счетчиков покупка после своей поставки всегда проходит
+        self.assertNotIn(False, sold[plain.pk])
+
+    def test_reserve_more_than_available(self):
+        book = Book.objects.create(title='Идиот', author='Достоевский', stock=2)
+        self.assertFalse(reserve(book.pk, 3))
+        self.assertTrue(reserve(book.pk, 2))
+        book.refresh_from_db()
+        self.assertEqual(book.stock, 0)
+
+
+class BookFormStockTests(TestCase):
+    def form(self, book, **data):
+        data = {
+            'title': book.title, 'author': book.author, 'genre': book.genre,
+            'price_rub': book.price_rub, **data,
+        }
+        return BookForm(data, instance=Book.objects.get(pk=book.pk))
+
+    def test_form_applies_only_users_change(self):
+        book = Book.objects.create(title='Идиот', author='Достоевский', stock=10)
+        form = self.form(book, stock=12, **{'initial-stock': 10})
+        self.assertTrue(form.is_valid(), form.errors)
+        # Покупки, пока форма была открыта
+        reserve(book.pk, 3)
+        saved = form.save()
+        self.assertEqual(saved.stock, 9)
+        self.assertEqual(Book.objects.get(pk=book.pk).stock, 9)
+
+    def test_form_without_stock_change_keeps_purchases(self):
+        book = Book.objects.create(title='Идиот', author='Достоевский', stock=1)
+        form = self.form(book, title='Бесы', stock=1, **{'initial-stock': 1})
+        self.assertTrue(form.is_valid(), form.errors)
+        reserve(book.pk)
+        form.save()
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.stock, book.is_available), ('Бесы', 0, False))
+
+
+class AnonymousSessionTests(TestCase):
+    """Анонимный просмотр каталога не обращается к хранилищу сессий"""
+    # Страница книги читает отзывы, которые могут лежать в шардах
+    databases = '__all__'
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Идиот', author='Достоевский')
+
+    def assert_no_session_work(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.session.accessed)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
+
+    def test_catalogue(self):
+        self.assert_no_session_work(reverse('book:book_list'))
+        self.assert_no_session_work(reverse('book:book_list') + '?genre=FICTION&page=1')
+
+    def test_book_page(self):
+        self.assert_no_session_work(reverse('book:book_detail', args=[self.book.pk]))
+
+
+class NormalizeIsbnTests(TestCase):
+    def test_isbn13_with_separators(self):
+        self.assertEqual(normalize_isbn('978-5-389-01006-2'), '9785389010062')
+        self.assertEqual(normalize_isbn(' 978 5 389 01006 2 '), '9785389010062')
+
+    def test_isbn10_is_converted(self):
+        self.assertEqual(normalize_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('0-306-40615-2'), normalize_isbn('978-0-306-40615-7'))
+
+    def test_invalid(self):
+        self.assertIsNone(normalize_isbn('978-5-389-01006-3'))
+        self.assertIsNone(normalize_isbn('0-306-40615-3'))
+        self.assertIsNone(normalize_isbn('12345'))
+        self.assertIsNone(normalize_isbn(''))
+        self.assertIsNone(normalize_isbn(None))
+
+
+class LegacyIsbnDuplicateTests(TestCase):
+    """Повторы ISBN из данных до миграции 0010: isbn_normalized пуст"""
+
+    def setUp(self):
+        self.original = Book.objects.create(title='Идиот', author='Достоевский', isbn='978-5-389-01006-2')
+        # bulk_create не вызывает save(), как и данные, внесенные до 0010
+        Book.objects.bulk_create([Book(title='Идиот (2)', author='Достоевский', isbn='9785389010062')])
+        self.duplicate = Book.objects.get(title='Идиот (2)')
+
+    def test_save_keeps_duplicate_unnormalized(self):
+        self.duplicate.title = 'Идиот, переиздание'
+        self.duplicate.save()
+        self.duplicate.refresh_from_db()
+        self.assertEqual(self.duplicate.title, 'Идиот, переиздание')
+        self.assertIsNone(self.duplicate.isbn_normalized)
+
+    def test_form_edit_keeps_duplicate_isbn(self):
+        form = BookForm({
+            'title': 'Идиот, переиздание', 'author': 'Достоевский', 'genre': self.duplicate.genre,
+            'price_rub': self.duplicate.price_rub, 'isbn': self.duplicate.isbn, 'stock': 0,
+        }, instance=self.duplicate)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertIsNone(Book.objects.get(pk=self.duplicate.pk).isbn_normalized)
+
+    def test_changed_isbn_is_normalized(self):
+        self.duplicate.isbn = '0-306-40615-2'
+        self.duplicate.save()
+        self.assertEqual(Book.objects.get(pk=self.duplicate.pk).isbn_normalized, '9780306406157')
+
+
+class ReviewsPageTests(TestCase):
+    # Отзывы могут лежать в шардах (book.sharding)
+    databases = '__all__'
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Идиот', author='Достоевский')
+        for number in range(25):
+            self.book.reviews.create(
+                reviewer_name=f'r{number}', email='r@example.com',
+                rating=5, text='Отзыв', is_approved=True,
+            )
+        self.book.reviews.create(
+            reviewer_name='hidden', email='r@example.com',
+            rating=1, text='Отзыв', is_approved=False,
+        )
+        # Одинаковое время у части отзывов: порядок держится на id
+        moment = timezone.now() - timedelta(days=1)
+        self.book.reviews.filter(pk__in=list(
+            self.book.reviews.order_by('pk').values_list('pk', flat=True)[:12]
+        )).update(created_at=moment)
+
+    def test_pages_cover_all_approved_reviews_once(self):
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            reviews, cursor = approved_reviews_page(self.book, cursor, size=10)
+            seen += reviews
+            pages += 1
+            if cursor is None:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len({review.pk for review in seen}), 25)
+        self.assertTrue(all(review.is_approved for review in seen))
+        keys = [(review.created_at, review.pk) for review in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        first, _ = approved_reviews_page(self.book, size=10)
+        reviews, _ = approved_reviews_page(self.book, 'bad|cursor', size=10)
+        self.assertEqual(reviews, first)
@@ -1,14 +1,32 @@
+from functools import lru_cache
+
 from django.urls import path
+from django.utils.module_loading import import_string
+
 from . import views
 
 app_name = 'book'
 
+
+def lazy_view(dotted_path):
+    """Представление, модуль которого импортируется при первом запросе"""
+
+    @lru_cache(maxsize=None)
+    def load():
+        return import_string(dotted_path).as_view()
+
+    def view(request, *args, **kwargs):
+        return load()(request, *args, **kwargs)
+
+    return view
+
+
 urlpatterns = [
     # Основные страницы
     path('', views.BookListView.as_view(), name='book_list'),  # ← name='book_list'
     path('about/', views.AboutView.as_view(), name='about'),
     path('contact/', views.ContactView.as_view(), name='contact'),
-    path('statistics/', views.StatisticsView.as_view(), name='statistics'),
+    path('statistics/', lazy_view('book.statistics_views.StatisticsView'), name='statistics'),
 
     # Детальные страницы книг
     path('book/<int:pk>/', views.BookDetailView.as_view(), name='book_detail'),
@@ -20,6 +38,7 @@ urlpatterns = [
 
     # Отзывы
     path('book/<int:book_id>/review/', views.BookReviewCreateView.as_view(), name='review_create'),
+    path('book/<int:pk>/reviews/', views.BookReviewsView.as_view(), name='book_reviews'),
 
     # Поиск и фильтрация
     path('search/', views.SearchResultsView.as_view(), name='search'),
@@ -27,5 +46,6 @@ urlpatterns = [
     path('author/<str:author>/', views.AuthorBooksView.as_view(), name='author_books'),
 
     # Экспорт
-    path('export/book/', views.ExportBooksView.as_view(), name='export_books'),
+    path('export/book/', lazy_view('book.export_views.ExportBooksView'), name='export_books'),
+    path('export/changes/', lazy_view('book.export_views.ChangeFeedView'), name='change_feed'),
 ]
\ No newline at end of file
@@ -1,20 +1,20 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import get_object_or_404
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, FormView
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q, Avg, Count, Min, Max, Sum, F, ExpressionWrapper, DecimalField
-from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.db.models import Q, Avg, Sum
+from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.http import JsonResponse, HttpResponse
-from django.utils import timezone
-from datetime import datetime, timedelta
-import json
-import csv
-from io import StringIO
-
-from .models import Book, BookReview
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.decorators import method_decorator
+
+from .archive import archived_reviews_count, get_archived_book
+from .models import Book, BookReview, BookTextAnalysis
 from .forms import BookForm, BookReviewForm, BookFilterForm, ContactForm
+from .ratelimit import ratelimit
+from .reviews import approved_reviews_page
+from .sidebars import get_sidebar
 
 
 class BookListView(ListView):
@@ -25,7 +25,7 @@ class BookListView(ListView):
     paginate_by = 15
 
     def get_queryset(self):
-        queryset = Book.objects.all()
+        queryset = Book.objects.for_table()
 
         # Параметры фильтрации
         search = self.request.GET.get('search', '')
@@ -68,21 +68,67 @@ class BookListView(ListView):
         context = super().get_context_data(**kwargs)
         context['filter_form'] = BookFilterForm(self.request.GET or None)
 
+        # Номера страниц рядом с текущей, без перебора всего page_range в шаблоне
+        page = context['page_obj']
+        if page is not None:
+            context['page_range'] = range(
+                max(page.number - 2, 1),
+                min(page.number + 2, page.paginator.num_pages) + 1
+            )
+
         # Статистика для главной страницы
         queryset = self.get_queryset()
         context['total_books'] = queryset.count()
-        context['recent_books'] = Book.objects.order_by('-created_at')[:5]
-        context['top_rated'] = Book.objects.filter(rating__isnull=False).order_by('-rating')[:5]
+        # Список берется из кэша (book.sidebars), при выбранном жанре - по жанру
+        genre = self.request.GET.get('genre') or None
+        if genre not in dict(Book.GENRE_CHOICES):
+            genre = None
+        context['recent_books'] = get_sidebar('recent', genre)
 
         return context
 
 
+def get_book_or_archived(pk):
+    """Книга каталога или, если ее нет, книга из архива"""
+    book = Book.objects.filter(pk=pk).first() or get_archived_book(pk)
+    if book is None:
+        raise Http404('Книга не найдена')
+    return book
+
+
 class BookDetailView(DetailView):
     """Детальная страница книги"""
     model = Book
     template_name = 'book/book_detail.html'
     context_object_name = 'book'
 
+    def get_object(self, queryset=None):
+        return get_book_or_archived(self.kwargs['pk'])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Только первая страница одобренных отзывов, остальные - через "Показать еще"
+        context['reviews'], context['reviews_cursor'] = approved_reviews_page(self.object)
+        context['reviews_count'] = (
+            self.object.reviews.filter(is_approved=True).count() + archived_reviews_count(self.object.pk)
+        )
+        context['archived'] = self.object._state.adding
+        # Результаты офлайн-анализа (команда analyze_reviews)
+        if context['archived']:
+            context['analysis'] = self.object.archived_analysis
+        else:
+            context['analysis'] = BookTextAnalysis.objects.filter(book=self.object).first()
+        return context
+
+
+class BookReviewsView(View):
+    """Следующая страница отзывов книги для кнопки "Показать еще" """
+
+    def get(self, request, pk):
+        book = get_book_or_archived(pk)
+        reviews, cursor = approved_reviews_page(book, request.GET.get('cursor'))
+        html = render_to_string('book/review_items.html', {'reviews': reviews}, request)
+        return JsonResponse({'html': html, 'cursor': cursor})
 
 
 class BookCreateView(LoginRequiredMixin, CreateView):
@@ -135,6 +181,7 @@ class BookDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+@method_decorator(ratelimit('review', '5/m'), name='dispatch')
 class BookReviewCreateView(CreateView):
     """Добавление отзыва к книге"""
     model = BookReview
@@ -147,9 +194,13 @@ class BookReviewCreateView(CreateView):
         return super().form_valid(form)
 
     def get_success_url(self):
-        return reverse('book_detail', kwargs={'pk': self.kwargs['book_id']})
+        return reverse('book:book_detail', kwargs={'pk': self.kwargs['book_id']})
 
 
+@method_decorator(
+    ratelimit('search', '30/m', methods=('GET',), condition=lambda request: request.GET.get('q')),
+    name='dispatch'
+)
 class SearchResultsView(ListView):
     """Расширенный поиск по книгам"""
     model = Book
@@ -162,7 +213,7 @@ class SearchResultsView(ListView):
 
         if query:
             # Расширенный поиск по всем полям
-            return Book.objects.filter(
+            return Book.objects.for_table().filter(
                 Q(title__icontains=query) |
                 Q(author__icontains=query) |
                 Q(short_description__icontains=query) |
@@ -179,76 +230,6 @@ class SearchResultsView(ListView):
         return context
 
 
-class StatisticsView(TemplateView):
-    """Страница расширенной статистики"""
-    template_name = 'book/statistics.html'
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-
-        # Общая статистика
-        total_books = Book.objects.count()
-        available_books = Book.objects.filter(is_available=True).count()
-        books_with_reviews = Book.objects.filter(reviews__isnull=False).distinct().count()
-
-        # Статистика по ценам
-        price_stats = Book.objects.aggregate(
-            avg_price=Avg('price_rub'),
-            min_price=Min('price_rub'),
-            max_price=Max('price_rub'),
-            total_value=Sum('price_rub')
-        )
-
-        # Статистика по жанрам
-        genre_stats = []
-        for genre_code, genre_name in Book.GENRE_CHOICES:
-            count = Book.objects.filter(genre=genre_code).count()
-            if count > 0:
-                avg_price = Book.objects.filter(genre=genre_code).aggregate(
-                    Avg('price_rub')
-                )['price_rub__avg'] or 0
-                genre_stats.append({
-                    'name': genre_name,
-                    'count': count,
-                    'percentage': (count / total_books * 100) if total_books > 0 else 0,
-                    'avg_price': avg_price
-                })
-
-        # Книги по годам
-        current_year = timezone.now().year
-        year_groups = {}
-        for year in range(2000, current_year + 1, 5):
-            next_year = year + 4 if year + 4 <= current_year else current_year
-            count = Book.objects.filter(
-                publication_year__gte=year,
-                publication_year__lte=next_year
-            ).count()
-            if count > 0:
-                year_groups[f'{year}-{next_year}'] = count
-
-        # Топ авторов
-        from django.db.models import Count
-        top_authors = Book.objects.values('author').annotate(
-            book_count=Count('id'),
-            avg_rating=Avg('rating')
-        ).order_by('-book_count')[:10]
-
-        context.update({
-            'total_books': total_books,
-            'available_books': available_books,
-            'books_with_reviews': books_with_reviews,
-            'price_stats': price_stats,
-            'genre_stats': sorted(genre_stats, key=lambda x: x['count'], reverse=True),
-            'year_groups': year_groups,
-            'top_authors': top_authors,
-            'recent_month': Book.objects.filter(
-                created_at__gte=timezone.now() - timedelta(days=30)
-            ).count(),
-        })
-
-        return context
-
-
 class AboutView(TemplateView):
     """Страница "О проекте" """
     template_name = 'book/about.html'
@@ -266,6 +247,7 @@ class AboutView(TemplateView):
         return context
 
 
+@method_decorator(ratelimit('contact', '3/m'), name='dispatch')
 class ContactView(FormView):
     """Страница контактов с формой обратной связи"""
     template_name = 'book/contact.html'
@@ -277,38 +259,6 @@ class ContactView(FormView):
         return super().form_valid(form)
 
 
-class ExportBooksView(LoginRequiredMixin, View):
-    """Экспорт книг в CSV"""
-
-    def get(self, request):
-        response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-        response['Content-Disposition'] = 'attachment; filename="books_export.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 'Название', 'Автор', 'Жанр', 'Цена (₽)', 'Рейтинг',
-            'Год издания', 'Страниц', 'ISBN', 'В наличии', 'Дата добавления'
-        ])
-
-        books = Book.objects.all().order_by('id')
-        for book in books:
-            writer.writerow([
-                book.id,
-                book.title,
-                book.author,
-                book.get_genre_display(),
-                book.price_rub,
-                book.rating or '',
-                book.publication_year or '',
-                book.page_count or '',
-                book.isbn or '',
-                'Да' if book.is_available else 'Нет',
-                book.created_at.strftime('%d.%m.%Y %H:%M')
-            ])
-
-        return response
-
-
 class GenreBooksView(ListView):
     """Страница книг определенного жанра"""
     model = Book
@@ -318,7 +268,7 @@ class GenreBooksView(ListView):
 
     def get_queryset(self):
         self.genre = self.kwargs['genre']
-        return Book.objects.filter(genre=self.genre, is_available=True)
+        return Book.objects.for_table().filter(genre=self.genre, is_available=True)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -336,7 +286,7 @@ class AuthorBooksView(ListView):
 
     def get_queryset(self):
         self.author = self.kwargs['author']
-        return Book.objects.filter(author=self.author, is_available=True)
+        return Book.objects.for_table().filter(author=self.author, is_available=True)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Сжатие и удаление отступов должны видеть итоговый ответ, поэтому стоят в начале
+    'book.middleware.ResponseOptimizationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,8 +60,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны хранятся в памяти процесса
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -78,9 +87,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Тестовая база в файле: общая база в памяти не ждет блокировку,
+        # а сразу выдает ошибку при параллельной записи (тесты book.stock)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Шардирование отзывов (book.sharding): число дополнительных файлов SQLite.
+# После включения выполните: python manage.py shard_reviews
+REVIEW_SHARDS = int(os.environ.get('BOOKSTORE_REVIEW_SHARDS', 0))
+
+for shard in range(REVIEW_SHARDS):
+    DATABASES[f'reviews_{shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'reviews_{shard}.sqlite3',
+    }
+
+if REVIEW_SHARDS:
+    DATABASE_ROUTERS = ['book.sharding.ReviewShardRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# В production здесь должен быть общий для всех воркеров бэкенд
+# (Redis/Memcached), иначе лимиты запросов считаются по каждому процессу отдельно.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Ограничение частоты запросов (book.ratelimit)
+RATELIMIT_ENABLED = True
+RATELIMIT_CACHE = 'default'
+RATELIMIT_TRUST_FORWARDED = False
+
+
+# Sessions and messages
+# https://docs.djangoproject.com/en/6.0/topics/http/sessions/
+# BOOKSTORE_SESSION_BACKEND: db, cached_db, cache или signed_cookies.
+# Сообщения хранятся в cookie, поэтому анонимный просмотр каталога не
+# создает сессию и не обращается к таблице django_session.
+
+SESSION_BACKENDS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_BACKENDS[os.environ.get('BOOKSTORE_SESSION_BACKEND', 'cached_db')]
+
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -117,3 +176,13 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Статические копии страниц каталога (manage.py prerender, book/prerender.py)
+PRERENDER_ROOT = os.environ.get('BOOKSTORE_PRERENDER_ROOT', BASE_DIR / 'prerendered')
+# Host, с которым запрашиваются страницы при генерации (должен быть в ALLOWED_HOSTS)
+PRERENDER_HOST = os.environ.get('BOOKSTORE_PRERENDER_HOST', 'localhost')
+
+# Архивация (manage.py archive, book/archive.py): возраст отзывов и срок
+# отсутствия книги в продаже, после которых они переносятся в архив
+ARCHIVE_REVIEWS_AFTER_DAYS = int(os.environ.get('BOOKSTORE_ARCHIVE_REVIEWS_AFTER_DAYS', 730))
+ARCHIVE_BOOKS_AFTER_DAYS = int(os.environ.get('BOOKSTORE_ARCHIVE_BOOKS_AFTER_DAYS', 365))
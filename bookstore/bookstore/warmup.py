@@ -0,0 +1,55 @@
+"""
+Прогрев приложения перед обработкой первых запросов.
+
+Импортирует представления и админку, строит URLconf, компилирует шаблоны
+и заполняет кэши, чтобы первый запрос к воркеру не платил за это.
+При preload в gunicorn прогрев выполняется в мастер-процессе, и
+результат разделяется воркерами через copy-on-write после fork.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Шаблоны, которые рендерятся на основных страницах
+WARM_TEMPLATES = [
+    'book/base.html',
+    'book/book_list.html',
+    'book/book_detail.html',
+    'book/review_items.html',
+    'book/statistics.html',
+    'book/about.html',
+    'book/contact.html',
+    'book/book_form.html',
+]
+
+
+def warm_up():
+    """Выполняет прогрев и возвращает затраченное время в секундах"""
+    started = time.perf_counter()
+
+    from django.contrib import admin
+    from django.db import connections
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    # Модули, которые urls.py подгружает лениво, при прогреве импортируются заранее
+    import book.bulk  # noqa: F401
+    import book.export_views  # noqa: F401
+    import book.statistics_views  # noqa: F401
+    import book.views  # noqa: F401
+
+    # Регистрация моделей в админке и сборка всех маршрутов
+    admin.autodiscover()
+    get_resolver().url_patterns
+
+    for name in WARM_TEMPLATES:
+        get_template(name)
+
+    # Соединения с БД нельзя передавать дочерним процессам через fork
+    connections.close_all()
+
+    elapsed = time.perf_counter() - started
+    logger.info('Прогрев завершен за %.3f с', elapsed)
+    return elapsed
@@ -0,0 +1,58 @@
+"""
+Production-конфигурация gunicorn.
+
+Запуск из каталога с manage.py:
+
+    gunicorn bookstore.wsgi
+
+Файл подхватывается автоматически. Параметры можно переопределить
+переменными окружения GUNICORN_*.
+"""
+
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# gthread: меньше процессов, потоки ждут БД и сеть параллельно;
+# sync: по одному запросу на процесс, предсказуемее для CPU-bound страниц
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gthread':
+    workers = int(os.environ.get('GUNICORN_WORKERS', cores + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+else:
+    workers = int(os.environ.get('GUNICORN_WORKERS', cores * 2 + 1))
+    threads = 1
+
+# Приложение загружается в мастере один раз, воркеры получают его через fork
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Плановый перезапуск воркеров ограничивает рост памяти;
+# jitter не дает всем воркерам перезапуститься одновременно
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = os.environ.get('GUNICORN_ERRORLOG', '-')
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def when_ready(server):
+    """С preload прогрев выполняется один раз в мастере до запуска воркеров"""
+    if preload_app:
+        from bookstore.warmup import warm_up
+        server.log.info('Прогрев в мастер-процессе: %.3f с', warm_up())
+
+
+def post_worker_init(worker):
+    """Без preload каждый воркер прогревается сам перед приемом запросов"""
+    if not preload_app:
+        from bookstore.warmup import warm_up
+        worker.log.info('Прогрев воркера %s: %.3f с', worker.pid, warm_up())